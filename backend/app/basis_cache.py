@@ -0,0 +1,209 @@
+"""
+Persistent on-disk cache of costly phase bases.
+
+For the "eigen" and "eigenfull" bases the Opticsetup constructor computes a
+modal basis whose cost grows steeply with the pupil sampling and Jmax. The
+basis only depends on the pupil, never on the image content, so the cache
+keeps just the basis state (phase_basis, convert, basis_type and the shape of
+the phase vector) keyed by the pupil geometry: the config fields that shape
+the pupil and the basis, plus the pupil map, pupil illumination and N of the
+built setup (so auto-detected N and centring are covered).
+
+When the cache holds a basis for the config, a setup is built with the cheap
+zernike basis for the geometry and image state, then given the cached basis.
+Otherwise the full setup is built directly and its basis stored, so a miss
+costs a single build. That build holds a per-config file lock: when search
+workers miss the same basis at once (a batch, a sweep), one builds it and the
+others wait and load it. Keys are salted with the core source so a core update
+never serves stale bases.
+
+Files live in STORAGE_PATH/setups and are shared by the API process and the
+search workers; the least recently used ones are evicted beyond
+SETUP_CACHE_MAX_MB.
+
+Warm-up for standard configurations (any images with the target geometry):
+
+    python -m app.basis_cache warm config.json images.npy [more.npy ...]
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from app.core import diversity as div
+from app.image_store import DEFAULT_STORAGE_PATH
+from app.models import OpticalConfigRequest
+
+logger = logging.getLogger(__name__)
+
+CACHED_BASES = ("eigen", "eigenfull")
+# Basis used to build the geometry before the cached basis is applied
+GEOMETRY_BASIS = "zernike"
+# Opticsetup attributes set by the basis computation
+BASIS_ATTRIBUTES = ("phase_basis", "basis_type", "convert")
+# Config fields that never change the pupil or the basis
+IMAGE_FIELDS = {"xc", "yc", "defoc_z", "object_fwhm_pix", "object_shape"}
+DEFAULT_MAX_MB = 4096
+
+
+def _core_fingerprint() -> str:
+    try:
+        with open(div.__file__, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except (OSError, TypeError):
+        return "unknown"
+
+
+class BasisDiskCache:
+    """Directory of pickled basis states with LRU size eviction"""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._salt = f"{_core_fingerprint()}-{np.__version__}"
+
+    def applies_to(self, config: OpticalConfigRequest) -> bool:
+        return self.max_bytes > 0 and config.basis in CACHED_BASES
+
+    def config_key(self, config: OpticalConfigRequest) -> str:
+        """Key prefix shared by the bases of ``config`` on any image stack"""
+        pupil_args = config.model_dump(
+            exclude=IMAGE_FIELDS
+            | {n for n in OpticalConfigRequest.model_fields if n.startswith("initial_")}
+        )
+        digest = hashlib.sha256(self._salt.encode("ascii"))
+        digest.update(json.dumps(pupil_args, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def key(self, geometry_setup, config: OpticalConfigRequest) -> str:
+        """Key of the basis of ``config`` on the pupil of ``geometry_setup``"""
+        digest = hashlib.sha256(str(int(geometry_setup.N)).encode("ascii"))
+        for name in ("pupilmap", "pupillum"):
+            array = np.ascontiguousarray(getattr(geometry_setup, name))
+            digest.update(f"{array.dtype.str}{array.shape}".encode("ascii"))
+            digest.update(array.tobytes())
+        return f"{self.config_key(config)}-{digest.hexdigest()[:16]}"
+
+    def knows(self, config: OpticalConfigRequest) -> bool:
+        """True if a basis of ``config`` is cached for some pupil"""
+        return any(self.root.glob(f"{self.config_key(config)}-*.pkl"))
+
+    @contextmanager
+    def build_lock(self, config: OpticalConfigRequest):
+        """Exclusive lock, across processes, on building a basis of ``config``"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / f"{self.config_key(config)}.lock", "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.pkl"
+
+    def load(self, key: str):
+        """Return the cached basis state, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️  Discarding unreadable cached basis {key}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return state
+
+    def save(self, key: str, state):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not cache basis {key}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict(keep=path)
+
+    def _evict(self, keep: Path):
+        files = sorted(self.root.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for path in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+            logger.info(f"🗑️  Evicted cached basis {path.stem}")
+
+
+def basis_state(opticsetup) -> dict:
+    """Basis-dependent state of a built setup"""
+    state = {name: getattr(opticsetup, name) for name in BASIS_ATTRIBUTES}
+    state["phase_size"] = np.size(opticsetup.phase)
+    return state
+
+
+def apply_basis_state(opticsetup, state: dict):
+    """Give ``opticsetup`` a cached basis, with a zero phase of matching size"""
+    for name in BASIS_ATTRIBUTES:
+        setattr(opticsetup, name, state[name])
+    opticsetup.phase = np.zeros(state["phase_size"])
+
+
+basis_cache = BasisDiskCache(
+    root=Path(os.environ.get("STORAGE_PATH", DEFAULT_STORAGE_PATH)) / "setups",
+    max_bytes=int(os.environ.get("SETUP_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024**2,
+)
+
+
+def _load_images(paths) -> np.ndarray:
+    stacks = [np.load(p, allow_pickle=False) for p in paths]
+    return np.concatenate([s if s.ndim == 3 else s[None] for s in stacks]).astype(
+        np.float64
+    )
+
+
+def main(argv=None):
+    from app.pipeline import get_or_create_opticsetup
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.basis_cache",
+        description="Pre-populate the on-disk phase basis cache",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm", help="Build and cache the basis of a geometry")
+    warm.add_argument("config", help="OpticalConfigRequest as a JSON file")
+    warm.add_argument("images", nargs="+", help=".npy image stacks or 2D images")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with open(args.config) as f:
+        config = OpticalConfigRequest.model_validate_json(f.read())
+    if not basis_cache.applies_to(config):
+        logger.error(f"Basis '{config.basis}' is not cached (only {CACHED_BASES})")
+        return 1
+
+    get_or_create_opticsetup(_load_images(args.images), config, logger)
+    logger.info(f"✅ Cached {config.basis} basis (Jmax={config.Jmax})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
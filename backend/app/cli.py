@@ -0,0 +1,193 @@
+"""
+Headless batch runner.
+
+Fits every file matching the given patterns (FITS, .npy, .npz or .raw with
+its sidecar; one file = one image stack) with one search request, in a
+process pool and without the web layer, then writes one row per file to a
+compressed NPZ table:
+
+    python -m app.cli request.json "data/**/*.fits" -o results.npz -j 8
+
+The request file is a SearchPhaseRequest (or only its ``config``) as JSON.
+Columns hold scalars per file (chi2, RMS, iterations, ...) or NaN-padded
+vectors (phase, defoc_z, optax_x, ...); ``path`` and ``error`` name the input
+and why its fit failed. ``--maps`` adds the phase maps as a float32 column.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.ingest import load_image_file
+from app.models import SearchPhaseRequest
+from app.pipeline import run_search
+
+logger = logging.getLogger(__name__)
+
+SCALAR_COLUMNS = {
+    "chi2": lambda r: r["results"]["chi2"],
+    "focscale": lambda r: r["results"]["focscale"],
+    "object_fwhm_pix": lambda r: r["results"]["object_fwhm_pix"],
+    "rms_nm": lambda r: r["results"]["rms_stats"]["raw"],
+    "weighted_rms_nm": lambda r: r["results"]["rms_stats"]["weighted"],
+    "weighted_rms_notiltdef_nm": lambda r: r["results"]["rms_stats"][
+        "weighted_notiltdef"
+    ],
+    "iterations": lambda r: r["search_stats"]["iterations"],
+    "duration_ms": lambda r: r["duration_ms"],
+    "truncated": lambda r: r["truncated"],
+}
+VECTOR_COLUMNS = (
+    "phase",
+    "defoc_z",
+    "optax_x",
+    "optax_y",
+    "amplitude",
+    "background",
+    "illum",
+)
+
+
+def expand_patterns(patterns: List[str]) -> List[str]:
+    """Files matching the glob patterns, sorted, each listed once"""
+    files = set()
+    for pattern in patterns:
+        files.update(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    return sorted(files)
+
+
+def fit_file(
+    path: str, request: SearchPhaseRequest, maps: bool = False
+) -> Dict[str, Any]:
+    """Worker: load one file, fit it and keep only the table columns"""
+    response = run_search(load_image_file(path), request)
+    row = {name: get(response) for name, get in SCALAR_COLUMNS.items()}
+    for name in VECTOR_COLUMNS:
+        row[name] = np.ravel(np.asarray(response["results"][name], dtype=float))
+    if maps:
+        row["phase_map"] = np.asarray(
+            response["results"]["phase_map"], dtype=np.float32
+        )
+    return row
+
+
+def _init_worker(level: int):
+    logging.basicConfig(level=level, format="%(processName)s %(message)s")
+
+
+def _column(values: List[Any]) -> np.ndarray:
+    """Stack per-file values, padding missing/shorter entries with NaN"""
+    present = [np.asarray(v) for v in values if v is not None]
+    if not present:
+        return np.full(len(values), np.nan)
+    shape = tuple(np.max([v.shape for v in present], axis=0)) if present[0].ndim else ()
+    dtype = np.float32 if present[0].dtype == np.float32 else np.float64
+    column = np.full((len(values),) + shape, np.nan, dtype=dtype)
+    for i, value in enumerate(values):
+        if value is not None:
+            value = np.asarray(value)
+            column[(i,) + tuple(slice(0, n) for n in value.shape)] = value
+    return column
+
+
+def build_table(files: List[str], rows: List[Any]) -> Dict[str, np.ndarray]:
+    """Columnar table of the fits; ``rows`` holds a row dict or an exception"""
+    ok = [not isinstance(r, BaseException) for r in rows]
+    columns = {
+        "path": np.array(files),
+        "ok": np.array(ok),
+        "error": np.array(["" if good else str(r) for good, r in zip(ok, rows)]),
+    }
+    names = [n for r, good in zip(rows, ok) if good for n in r]
+    for name in dict.fromkeys(names):
+        columns[name] = _column(
+            [r[name] if good else None for r, good in zip(rows, ok)]
+        )
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description="Fit a batch of image files without the web API",
+    )
+    parser.add_argument(
+        "request", help="SearchPhaseRequest (or OpticalConfigRequest) as JSON"
+    )
+    parser.add_argument(
+        "patterns", nargs="+", help="Glob patterns of image files (** allowed)"
+    )
+    parser.add_argument("-o", "--output", default="results.npz", help="NPZ table")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=int(os.environ.get("SEARCH_WORKERS", os.cpu_count() or 1)),
+        help="Fits run in parallel (default: SEARCH_WORKERS or the CPU count)",
+    )
+    parser.add_argument(
+        "--maps", action="store_true", help="Also store the phase maps (float32)"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log the fits")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with open(args.request) as f:
+        data = json.load(f)
+    request = SearchPhaseRequest.model_validate(
+        data if "config" in data else {"config": data}
+    )
+    # Only the phase map is stored: workers return no other map
+    request.result_arrays = ["phase_map"] if args.maps else []
+    files = expand_patterns(args.patterns)
+    if not files:
+        logger.error(f"No file matches {args.patterns}")
+        return 1
+
+    # Workers split the FFT threads between them (see app.fft_backend)
+    os.environ["SEARCH_WORKERS"] = str(args.workers)
+    logger.info(f"🚀 Fitting {len(files)} files with {args.workers} workers")
+    start = time.time()
+    rows: List[Any] = [None] * len(files)
+    level = logging.INFO if args.verbose else logging.WARNING
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(level,),
+    ) as pool:
+        futures = {
+            pool.submit(fit_file, path, request, args.maps): i
+            for i, path in enumerate(files)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                rows[i] = future.result()
+                status = f"chi2={rows[i]['chi2']:.4g}"
+            except Exception as e:
+                rows[i] = e
+                status = f"❌ {e}"
+            logger.info(f"[{done}/{len(files)}] {files[i]}: {status}")
+
+    table = build_table(files, rows)
+    np.savez_compressed(args.output, **table)
+    failed = int((~table["ok"]).sum())
+    logger.info(
+        f"✅ {len(files) - failed}/{len(files)} fits written to {args.output} "
+        f"in {time.time() - start:.1f} s"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Coarse-to-fine phase searches.
+
+The coarse stage fits images binned by ``factor`` with the first
+``coarse_jmax`` modes; the full-resolution search then starts from its
+solution through the initial_* fields, and only needs a few iterations.
+
+Binning by f with pixelSize x f and N / f keeps the pupil sampling: the pupil
+diameter in computation pixels, pdiam ~ N * pixelSize / (wvl * fratio), is
+unchanged, only the focal-plane arrays are f^2 times smaller. Pupil-plane
+quantities (phase coefficients, illumination) therefore carry over as is;
+the object size in pixels is scaled by f. The factor is reduced until the
+binned images stay Nyquist-sampled (wvl * fratio / pixelSize >= 2).
+"""
+
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.models import SearchPhaseRequest
+
+logger = logging.getLogger(__name__)
+
+NYQUIST_SAMPLING = 2.0
+
+
+def sampling_factor(config) -> float:
+    return config.wvl * config.fratio / config.pixelSize
+
+
+def usable_factor(config, factor: int) -> int:
+    """Largest binning factor <= ``factor`` keeping Nyquist sampling"""
+    sampling = sampling_factor(config) * (1 + 1e-9)  # wvl * fratio rounding
+    while factor > 1 and sampling / factor < NYQUIST_SAMPLING:
+        factor -= 1
+    return factor
+
+
+def bin_images(img_array: np.ndarray, factor: int) -> np.ndarray:
+    """Average f x f blocks of each image (edges cropped to a multiple of f)"""
+    n, h, w = img_array.shape
+    h, w = h - h % factor, w - w % factor
+    blocks = img_array[:, :h, :w].reshape(n, h // factor, factor, w // factor, factor)
+    return blocks.mean(axis=(2, 4))
+
+
+def coarse_stage(
+    img_array: np.ndarray, request: SearchPhaseRequest
+) -> Optional[Tuple[np.ndarray, SearchPhaseRequest, int]]:
+    """
+    Binned images and request of the coarse stage, with the binning factor
+    used; None when the images cannot be binned without undersampling.
+    """
+    config = request.config
+    factor = usable_factor(config, request.coarse_factor)
+    if factor < 2:
+        logger.warning(
+            f"⚠️  Coarse stage skipped: sampling {sampling_factor(config):.2f} "
+            f"does not allow binning without undersampling"
+        )
+        return None
+    if factor != request.coarse_factor:
+        logger.info(f"   Coarse binning reduced to {factor} to keep Nyquist sampling")
+
+    coarse_config = config.model_copy(
+        update={
+            "pixelSize": config.pixelSize * factor,
+            "N": config.N // factor if config.N else None,
+            "xc": config.xc // factor if config.xc is not None else None,
+            "yc": config.yc // factor if config.yc is not None else None,
+            "object_fwhm_pix": config.object_fwhm_pix / factor,
+            "Jmax": min(config.Jmax, request.coarse_jmax),
+            "initial_object_fwhm_pix": (
+                config.initial_object_fwhm_pix / factor
+                if config.initial_object_fwhm_pix is not None
+                else None
+            ),
+        }
+    )
+    coarse_request = request.model_copy(
+        update={"config": coarse_config, "coarse_factor": None}
+    )
+    return bin_images(img_array, factor), coarse_request, factor
+
+
+def refine_request(
+    request: SearchPhaseRequest, coarse: Dict[str, Any], factor: int
+) -> SearchPhaseRequest:
+    """Full-resolution request starting from the coarse solution"""
+    results = coarse["results"]
+    config = request.config.model_copy(
+        update={
+            "initial_phase": np.asarray(results["phase"], dtype=float).tolist(),
+            "initial_defoc_z": np.asarray(results["defoc_z"], dtype=float).tolist(),
+            "initial_focscale": float(results["focscale"]),
+            "initial_optax_x": np.asarray(results["optax_x"], dtype=float).tolist(),
+            "initial_optax_y": np.asarray(results["optax_y"], dtype=float).tolist(),
+            "initial_illum": np.asarray(results["illum"], dtype=float).tolist(),
+            "initial_object_fwhm_pix": float(results["object_fwhm_pix"]) * factor,
+        }
+    )
+    update = {"config": config, "coarse_factor": None}
+    if request.refine_max_iterations is not None:
+        update["max_iterations"] = request.refine_max_iterations
+    return request.model_copy(update=update)
+
+
+def coarse_summary(coarse: Dict[str, Any], factor: int, jmax: int) -> Dict[str, Any]:
+    return {
+        "factor": factor,
+        "jmax": jmax,
+        "chi2": coarse["results"]["chi2"],
+        "duration_ms": coarse["duration_ms"],
+        "truncated": coarse["truncated"],
+        "search_stats": coarse["search_stats"],
+    }
@@ -0,0 +1,172 @@
+"""
+Pluggable FFT backend for the PSF model.
+
+The core computes its pupil-to-focal-plane transforms with numpy.fft, which
+runs on a single thread. As with log_capture and progress, the numpy.fft
+functions are wrapped once per process and dispatch through a context
+variable: inside ``use_fft_backend("scipy", workers)`` transforms go to
+scipy.fft with ``workers`` threads (pocketfft, which caches its plans per
+size and splits batched transforms over a stacked array across threads),
+elsewhere numpy.fft runs unchanged. Names the core imported directly from
+numpy.fft are wrapped too.
+
+With ``precision="float32"`` (experimental) inputs are cast to
+complex64/float32 before the transform, so the FFTs run in single precision
+on both backends. The cast is an extra copy per call and the core's own
+arithmetic promotes results back to double precision, so the net effect on
+memory traffic and speed is unmeasured; validate with app.precision first.
+
+Benchmark: ``python -m app.fft_backend [N] [n_images] [workers]``
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from app.core import diversity as div
+
+BACKENDS = ("numpy", "scipy")
+PRECISIONS = ("float64", "float32")
+FFT_FUNCTIONS = (
+    "fft",
+    "ifft",
+    "fft2",
+    "ifft2",
+    "fftn",
+    "ifftn",
+    "rfft",
+    "irfft",
+    "rfft2",
+    "irfft2",
+    "rfftn",
+    "irfftn",
+)
+
+DEFAULT_BACKEND = os.environ.get("FFT_BACKEND", "numpy")
+# Threads per search: the cores left to each search worker process by default
+DEFAULT_WORKERS = int(
+    os.environ.get(
+        "FFT_WORKERS",
+        max(
+            1,
+            (os.cpu_count() or 1)
+            // int(os.environ.get("SEARCH_WORKERS", os.cpu_count() or 1)),
+        ),
+    )
+)
+
+_backend: ContextVar[Optional["FFTBackend"]] = ContextVar("fft_backend", default=None)
+_install_lock = threading.Lock()
+
+
+class FFTBackend:
+    """Forward FFT calls to numpy.fft or scipy.fft with a thread count"""
+
+    def __init__(self, name: str, workers: int = 1, precision: str = "float64"):
+        if name not in BACKENDS:
+            raise ValueError(
+                f"Unknown FFT backend {name!r}, expected one of {BACKENDS}"
+            )
+        if precision not in PRECISIONS:
+            raise ValueError(
+                f"Unknown precision {precision!r}, expected one of {PRECISIONS}"
+            )
+        self.name = name
+        self.workers = max(1, workers)
+        self.single = precision == "float32"
+        if name == "scipy":
+            import scipy.fft
+
+            self._module = scipy.fft
+        else:
+            self._module = None
+
+    def call(self, original: Callable, fn_name: str, *args, **kwargs):
+        if self.single and args:
+            a = np.asarray(args[0])
+            single = np.complex64 if np.iscomplexobj(a) else np.float32
+            args = (a.astype(single, copy=False),) + args[1:]
+        if self._module is None or "out" in kwargs:
+            return original(*args, **kwargs)
+        return getattr(self._module, fn_name)(*args, workers=self.workers, **kwargs)
+
+
+def _dispatching(fn_name: str, original: Callable) -> Callable:
+    def fft_dispatch(*args, **kwargs):
+        backend = _backend.get()
+        if backend is None:
+            return original(*args, **kwargs)
+        return backend.call(original, fn_name, *args, **kwargs)
+
+    fft_dispatch.__name__ = fn_name
+    fft_dispatch.__doc__ = original.__doc__
+    fft_dispatch.__wrapped__ = original
+    return fft_dispatch
+
+
+def install():
+    """Wrap the numpy.fft functions for this process (idempotent)"""
+    with _install_lock:
+        originals: Dict[int, Callable] = {}
+        for fn_name in FFT_FUNCTIONS:
+            original = getattr(np.fft, fn_name)
+            if hasattr(original, "__wrapped__"):
+                continue
+            wrapped = _dispatching(fn_name, original)
+            setattr(np.fft, fn_name, wrapped)
+            originals[id(original)] = wrapped
+        # from numpy.fft import fft2 in the core keeps a direct reference
+        for attr, value in vars(div).items():
+            if id(value) in originals:
+                setattr(div, attr, originals[id(value)])
+
+
+@contextmanager
+def use_fft_backend(
+    name: Optional[str] = None,
+    workers: Optional[int] = None,
+    precision: str = "float64",
+):
+    """Run the FFTs of the current context on the given backend"""
+    backend = FFTBackend(name or DEFAULT_BACKEND, workers or DEFAULT_WORKERS, precision)
+    install()
+    token = _backend.set(backend)
+    try:
+        yield backend
+    finally:
+        _backend.reset(token)
+
+
+def benchmark(N: int = 512, n_images: int = 4, workers: int = DEFAULT_WORKERS):
+    """Time a batched complex 2D transform of n_images N x N fields"""
+    rng = np.random.default_rng(0)
+    fields = rng.standard_normal((n_images, N, N)) + 1j * rng.standard_normal(
+        (n_images, N, N)
+    )
+    results = {}
+    for name, threads in (("numpy", 1), ("scipy", 1), ("scipy", workers)):
+        with use_fft_backend(name, threads):
+            np.fft.fft2(fields)  # warm-up (plan creation)
+            repeats = 5
+            start = time.perf_counter()
+            for _ in range(repeats):
+                np.fft.fft2(fields)
+            elapsed = (time.perf_counter() - start) / repeats
+        results[f"{name} x{threads}"] = elapsed
+    return results
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:4]]
+    results = benchmark(*args)
+    reference = results["numpy x1"]
+    for label, elapsed in results.items():
+        print(
+            f"{label:>10}: {elapsed * 1000:8.2f} ms  (x{reference / elapsed:.2f} vs numpy)"
+        )
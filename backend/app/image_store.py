@@ -0,0 +1,118 @@
+"""
+Content-addressed store for parsed image stacks.
+
+Stacks are saved once as .npy files named after a hash of their content, so
+preview and search requests can reference them by ``image_id`` instead of
+re-uploading the data. Files are opened memory-mapped and the least recently
+used ones are evicted when the store exceeds its size budget.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORAGE_PATH = Path(__file__).parent / "storage"
+DEFAULT_MAX_MB = 2048
+
+
+class ImageStore:
+    """LRU-bounded directory of .npy stacks keyed by content hash."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # id -> size
+        self._total_bytes = 0
+
+        # Reload what a previous process left behind, oldest access first
+        existing = sorted(self.root.glob("*.npy"), key=lambda p: p.stat().st_mtime)
+        for path in existing:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def content_id(array: np.ndarray) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{array.dtype.str}{array.shape}".encode("ascii"))
+        digest.update(np.ascontiguousarray(array).data)
+        return digest.hexdigest()[:32]
+
+    def _path(self, image_id: str) -> Path:
+        return self.root / f"{image_id}.npy"
+
+    def put(self, array: np.ndarray) -> str:
+        """Store an array (no-op if already present) and return its id."""
+        image_id = self.content_id(array)
+        path = self._path(image_id)
+
+        with self._lock:
+            if image_id in self._entries and path.exists():
+                self._entries.move_to_end(image_id)
+                os.utime(path)
+                return image_id
+
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            size = path.stat().st_size
+            if image_id not in self._entries:
+                self._total_bytes += size
+            self._entries[image_id] = size
+            self._entries.move_to_end(image_id)
+            self._evict(keep=image_id)
+
+        logger.info(f"💾 Stored image stack {image_id} {array.shape}")
+        return image_id
+
+    def get(self, image_id: str) -> Optional[np.ndarray]:
+        """Return the stored stack memory-mapped read-only, or None if unknown."""
+        if not image_id.isalnum():
+            return None
+        path = self._path(image_id)
+
+        with self._lock:
+            if image_id not in self._entries or not path.exists():
+                self._forget(image_id)
+                return None
+            self._entries.move_to_end(image_id)
+
+        os.utime(path)
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+
+    def _forget(self, image_id: str):
+        size = self._entries.pop(image_id, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self, keep: Optional[str] = None):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            image_id = next(iter(self._entries))
+            if image_id == keep:
+                break
+            self._forget(image_id)
+            try:
+                self._path(image_id).unlink()
+            except FileNotFoundError:
+                pass
+            logger.info(f"🗑️  Evicted image stack {image_id}")
+
+
+image_store = ImageStore(
+    root=Path(os.environ.get("STORAGE_PATH", DEFAULT_STORAGE_PATH)) / "images",
+    max_bytes=int(os.environ.get("IMAGE_STORE_MAX_MB", DEFAULT_MAX_MB)) * 1024**2,
+)
@@ -0,0 +1,350 @@
+"""
+Image collection ingestion for /api/parse-images.
+
+Supported inputs: FITS (.fits/.fit, every image HDU, 2D images or 3D cubes),
+NumPy .npy (2D or 3D), .npz (every 2D/3D member) and raw binary .raw files,
+which need a sidecar ``<name>.raw.json`` upload giving ``shape`` and
+optionally ``dtype`` (default little-endian uint16).
+
+Uploads are spooled to disk in chunks and FITS files are opened with memmap,
+so an HDU is only a view on the file: nothing is read before the selected
+planes are copied, once, into a preallocated stack of the target dtype. Peak
+memory is the output stack plus one chunk, instead of raw bytes + decoded HDU
+data + a stacked copy + a float64 copy.
+
+Integer data with BSCALE/BZERO is read unscaled and scaled plane by plane in
+the output stack, so astropy never materialises a scaled copy of a whole cube.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from astropy.io import fits
+from fastapi import HTTPException, UploadFile
+
+from app.stats import RunningStats, row_chunks
+
+logger = logging.getLogger(__name__)
+
+MIN_IMAGES = 2
+# Most images kept from one upload; through-focus cubes hold 30-100 planes
+MAX_IMAGES = int(os.environ.get("MAX_IMAGES", 100))
+FITS_EXTENSIONS = (".fits", ".fit")
+NPY_EXTENSIONS = (".npy",)
+NPZ_EXTENSIONS = (".npz",)
+RAW_EXTENSIONS = (".raw",)
+SIDECAR_SUFFIX = ".json"
+RAW_DEFAULT_DTYPE = "<u2"
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# Directory for spooled uploads (default: system temp directory)
+SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR") or None
+# dtype of the parsed stack: float64 (default) or float32
+IMAGE_DTYPE = np.dtype(os.environ.get("IMAGE_DTYPE", "float64"))
+
+
+@dataclass
+class PlaneRef:
+    """One 2D image of the collection, not read yet"""
+
+    data: np.ndarray  # memmap view, raw (unscaled) values
+    info: Dict[str, Any]
+    scale: float = 1.0
+    offset: float = 0.0
+
+    @property
+    def dtype(self) -> np.dtype:
+        """dtype astropy would have returned for the scaled data"""
+        if self.scale == 1.0 and self.offset == 0.0:
+            return self.data.dtype
+        if (
+            self.data.dtype.kind == "i"
+            and self.scale == 1.0
+            and self.offset == 2 ** (self.data.dtype.itemsize * 8 - 1)
+        ):
+            return np.dtype(f"u{self.data.dtype.itemsize}")
+        return np.dtype(np.float64 if self.data.dtype.itemsize > 2 else np.float32)
+
+    def copy_to(self, out: np.ndarray, rows: slice = slice(None)):
+        """Copy (a block of rows of) the scaled plane into ``out``"""
+        np.copyto(out, self.data[rows], casting="unsafe")
+        if self.scale != 1.0:
+            out *= self.scale
+        if self.offset != 0.0:
+            out += self.offset
+
+
+def serialize_header(header: fits.Header) -> Dict[str, Any]:
+    """Convertit un Header Astropy en un dict sérialisable en JSON."""
+    header_dict = {}
+    for key, value in header.items():
+        if key in ("COMMENT", "HISTORY"):
+            # Gérer les listes de commentaires/historique
+            header_dict[key] = list(value)
+        else:
+            # str() gère les types non-JSON comme 'Undefined'
+            header_dict[key] = str(value)
+    return header_dict
+
+
+async def spool_upload(file: UploadFile, directory: str) -> Path:
+    """Copy an upload to ``directory`` in chunks and return its path"""
+    fd, name = tempfile.mkstemp(suffix=Path(file.filename).suffix, dir=directory)
+    path = Path(name)
+    with os.fdopen(fd, "wb") as f:
+        while chunk := await file.read(SPOOL_CHUNK_SIZE):
+            f.write(chunk)
+    return path
+
+
+def fits_planes(path: Path, filename: str, resources: ExitStack) -> Iterator[PlaneRef]:
+    """Yield the 2D planes of every image HDU of a FITS file, as memmap views"""
+    hdul = resources.enter_context(
+        fits.open(path, memmap=True, do_not_scale_image_data=True)
+    )
+    # 2. Boucler sur chaque HDU dans ce fichier
+    for hdu_index, hdu in enumerate(hdul):
+        if not hdu.is_image or hdu.data is None:
+            continue  # Ignorer les HDUs non-image ou vides
+
+        data = hdu.data
+        header = hdu.header
+        info = {
+            "source_file": filename,
+            "source_hdu_index": hdu_index,
+            "header": serialize_header(header),
+        }
+        scale = float(header.get("BSCALE", 1.0))
+        offset = float(header.get("BZERO", 0.0))
+
+        # 3. Gérer les données (Cube 3D ou Image 2D)
+        if data.ndim == 3:
+            logger.info(
+                f"Fichier {filename} [HDU {hdu_index}]: Détection d'un cube 3D {data.shape}"
+            )
+            # Le header principal du cube est partagé par tous ses plans
+            for i in range(data.shape[0]):
+                yield PlaneRef(data[i], info, scale, offset)
+        elif data.ndim == 2:
+            logger.info(
+                f"Fichier {filename} [HDU {hdu_index}]: Détection d'une image 2D {data.shape}"
+            )
+            yield PlaneRef(data, info, scale, offset)
+
+
+def _array_planes(
+    data: np.ndarray, info: Dict[str, Any], filename: str
+) -> Iterator[PlaneRef]:
+    if data.ndim == 3:
+        logger.info(f"Fichier {filename}: Détection d'un cube 3D {data.shape}")
+        for i in range(data.shape[0]):
+            yield PlaneRef(data[i], info)
+    elif data.ndim == 2:
+        logger.info(f"Fichier {filename}: Détection d'une image 2D {data.shape}")
+        yield PlaneRef(data, info)
+    else:
+        logger.warning(f"Fichier {filename}: tableau {data.shape} ignoré (ni 2D ni 3D)")
+
+
+def npy_planes(path: Path, filename: str, resources: ExitStack) -> Iterator[PlaneRef]:
+    """Yield the planes of a .npy array, memory-mapped (no parsing, no copy)"""
+    data = np.load(path, mmap_mode="r", allow_pickle=False)
+    info = {"source_file": filename, "source_hdu_index": 0, "header": {}}
+    yield from _array_planes(data, info, filename)
+
+
+def npz_planes(path: Path, filename: str, resources: ExitStack) -> Iterator[PlaneRef]:
+    """Yield the planes of every 2D/3D member of a .npz archive, in order"""
+    archive = resources.enter_context(np.load(path, allow_pickle=False))
+    for index, key in enumerate(archive.files):
+        # Members are only decompressed once reached
+        info = {
+            "source_file": filename,
+            "source_hdu_index": index,
+            "source_key": key,
+            "header": {},
+        }
+        yield from _array_planes(archive[key], info, f"{filename}[{key}]")
+
+
+def raw_planes(
+    path: Path, filename: str, resources: ExitStack, sidecar: Dict[str, Any]
+) -> Iterator[PlaneRef]:
+    """Yield the planes of a headerless binary file described by its sidecar"""
+    shape = tuple(int(n) for n in sidecar["shape"])
+    dtype = np.dtype(sidecar.get("dtype", RAW_DEFAULT_DTYPE))
+    data = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+    info = {"source_file": filename, "source_hdu_index": 0, "header": sidecar}
+    yield from _array_planes(data, info, filename)
+
+
+@dataclass
+class ImageCollection:
+    images: np.ndarray
+    image_info: List[Dict[str, Any]]
+    warning: Optional[str]
+    original_dtype: str
+    shape_consistent: bool
+    image_stats: List[RunningStats]
+
+
+def stack_planes(
+    planes: List[PlaneRef], dtype: np.dtype = IMAGE_DTYPE
+) -> Tuple[np.ndarray, str, bool, List[RunningStats]]:
+    """
+    Copy planes into one preallocated (N, H, W) array.
+
+    Statistics of each image are accumulated on every block of rows right
+    after it is copied, while it is still in cache.
+
+    Returns (stack, original_dtype, shape_consistent, image_stats).
+    """
+    first_shape = planes[0].data.shape
+    shape_consistent = all(p.data.shape == first_shape for p in planes)
+    if not shape_consistent:
+        shapes = sorted({p.data.shape for p in planes})
+        logger.warning(f"Incohérence de dimensions: {shapes}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Impossible d'empiler les images (dimensions incohérentes) : {shapes}",
+        )
+
+    original_dtype = str(np.result_type(*[p.dtype for p in planes]))
+    stack = np.empty((len(planes),) + first_shape, dtype=dtype)
+    image_stats = []
+    for i, plane in enumerate(planes):
+        stats = RunningStats()
+        try:
+            for rows in row_chunks(first_shape[0], int(np.prod(first_shape[1:]))):
+                block = stack[i, rows]
+                plane.copy_to(block, rows)
+                stats.update(block)
+        except Exception as e:
+            # Les plans sont lus ici (memmap) : fichier tronqué ou corrompu
+            source = plane.info.get("source_file")
+            logger.error(f"Erreur à la lecture de {source}: {e}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Erreur à la lecture de {source} (image {i}) : {e}",
+            )
+        image_stats.append(stats)
+    return stack, original_dtype, shape_consistent, image_stats
+
+
+def load_image_file(path: Path, dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Read every plane of one file on disk into a (N, H, W) stack.
+
+    Same formats as the upload path; a .raw file needs its ``<name>.raw.json``
+    sidecar next to it.
+    """
+    path = Path(path)
+    name = path.name.lower()
+    with ExitStack() as resources:
+        if name.endswith(FITS_EXTENSIONS):
+            planes = list(fits_planes(path, path.name, resources))
+        elif name.endswith(NPY_EXTENSIONS):
+            planes = list(npy_planes(path, path.name, resources))
+        elif name.endswith(NPZ_EXTENSIONS):
+            planes = list(npz_planes(path, path.name, resources))
+        elif name.endswith(RAW_EXTENSIONS):
+            sidecar = json.loads(Path(f"{path}{SIDECAR_SUFFIX}").read_text())
+            planes = list(raw_planes(path, path.name, resources, sidecar))
+        else:
+            raise ValueError(f"Unsupported file format: {path.name}")
+        if not planes:
+            raise ValueError(f"No 2D image found in {path.name}")
+        stack, _, _, _ = stack_planes(planes, dtype)
+    return stack
+
+
+async def load_flexible_image_collection(
+    files: List[UploadFile],
+) -> ImageCollection:
+    """
+    Charge les images FITS, NPY, NPZ ou brutes de manière flexible.
+
+    Tente de charger entre 2 et MAX_IMAGES images 2D à partir de n'importe quelle
+    combinaison de fichiers, HDUs, membres NPZ ou cubes 3D.
+
+    Retourne la pile 3D, les infos par image, un éventuel warning, le dtype
+    d'origine et les statistiques de chaque image.
+    """
+    planes: List[PlaneRef] = []
+    warning = None
+    sidecars = {
+        f.filename[: -len(SIDECAR_SUFFIX)]: f
+        for f in files
+        if f.filename.endswith(SIDECAR_SUFFIX)
+    }
+
+    with ExitStack() as resources:
+        spool_dir = resources.enter_context(
+            tempfile.TemporaryDirectory(prefix="upload-", dir=SPOOL_DIR)
+        )
+
+        # 1. Boucler sur chaque fichier envoyé
+        for file in files:
+            name = file.filename.lower()
+            if name.endswith(SIDECAR_SUFFIX) and file.filename[
+                : -len(SIDECAR_SUFFIX)
+            ].lower().endswith(RAW_EXTENSIONS):
+                continue  # Lu avec son fichier .raw
+            if not name.endswith(
+                FITS_EXTENSIONS + NPY_EXTENSIONS + NPZ_EXTENSIONS + RAW_EXTENSIONS
+            ):
+                logger.warning(f"Fichier ignoré (format non supporté): {file.filename}")
+                continue
+
+            try:
+                path = await spool_upload(file, spool_dir)
+                if name.endswith(FITS_EXTENSIONS):
+                    file_planes = fits_planes(path, file.filename, resources)
+                elif name.endswith(NPY_EXTENSIONS):
+                    file_planes = npy_planes(path, file.filename, resources)
+                elif name.endswith(NPZ_EXTENSIONS):
+                    file_planes = npz_planes(path, file.filename, resources)
+                else:
+                    sidecar_file = sidecars.get(file.filename)
+                    if sidecar_file is None:
+                        raise ValueError(
+                            f"fichier {file.filename}{SIDECAR_SUFFIX} (shape, dtype) manquant"
+                        )
+                    sidecar = json.loads(await sidecar_file.read())
+                    file_planes = raw_planes(path, file.filename, resources, sidecar)
+
+                for plane in file_planes:
+                    if len(planes) >= MAX_IMAGES:
+                        warning = f"Limite de {MAX_IMAGES} images atteinte. Les images suivantes ont été ignorées."
+                        break
+                    planes.append(plane)
+            except Exception as e:
+                logger.error(f"Erreur à la lecture de {file.filename}: {e}")
+                # On continue avec les autres fichiers
+                pass
+
+            if warning:
+                break  # Sortir de la boucle des Fichiers
+
+        # 4. Validation finale des contraintes
+        if len(planes) < MIN_IMAGES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Au moins {MIN_IMAGES} images sont requises. {len(planes)} seulement ont été trouvées.",
+            )
+
+        # Seuls les plans retenus sont lus, une seule fois
+        stack, original_dtype, shape_consistent, image_stats = stack_planes(planes)
+
+    logger.info(f"Chargement terminé. {len(planes)} images collectées.")
+    info_list = [plane.info for plane in planes]
+    return ImageCollection(
+        stack, info_list, warning, original_dtype, shape_consistent, image_stats
+    )
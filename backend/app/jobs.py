@@ -0,0 +1,248 @@
+"""
+Background job subsystem for phase searches.
+
+Fits run in a ProcessPoolExecutor so a Levenberg-Marquardt run never blocks
+the event loop, and N fits can run concurrently on an N-core machine. Log
+records emitted in the workers are shipped back through a multiprocessing
+queue and re-emitted in the API process, where the WebSocket handler picks
+them up like any other log line.
+
+Pending jobs are cancelled outright. Running ones are flagged in a dict shared
+with the workers (through a multiprocessing manager); the search polls
+cancel_requested() and stops at its next model evaluation, returning the best
+coefficients found so far.
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+from app import log_capture
+from app.log_capture import JobContextFilter, current_job_id, job_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+# Finished jobs kept in memory for GET /api/jobs/{id}, with their results for
+# jobs queued through POST /api/jobs/search-phase
+DEFAULT_MAX_FINISHED_JOBS = 50
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    future: Future
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+    # Only jobs polled through GET /api/jobs/{id} keep their result once done
+    keep_result: bool = False
+
+    @property
+    def status(self) -> JobStatus:
+        if self.future.done():
+            if self.future.cancelled():
+                return JobStatus.CANCELLED
+            if self.future.exception() is not None:
+                return JobStatus.FAILED
+            if self.cancel_requested:
+                return JobStatus.CANCELLED
+            return JobStatus.DONE
+        if self.future.running():
+            return JobStatus.RUNNING
+        return JobStatus.PENDING
+
+    @property
+    def has_result(self) -> bool:
+        """True once a result is available (a cancelled run returns its best)"""
+        return (
+            self.keep_result
+            and self.future.done()
+            and not self.future.cancelled()
+            and self.future.exception() is None
+        )
+
+    @property
+    def error(self) -> Optional[str]:
+        if not self.future.done():
+            return None
+        if self.future.cancelled():
+            return "Job was cancelled"
+        exc = self.future.exception()
+        return str(exc) if exc is not None else None
+
+    def without_result(self) -> "Job":
+        """Copy of a finished job with the same status and error, but no result"""
+        future: Future = Future()
+        if self.future.cancelled():
+            future.cancel()
+        elif self.future.exception() is not None:
+            future.set_exception(self.future.exception())
+        else:
+            future.set_result(None)
+        return replace(self, future=future)
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "elapsed_ms": int((end - self.created_at) * 1000),
+            "error": self.error,
+        }
+
+
+class _RecordDispatcher(logging.Handler):
+    """Re-emit records received from workers through the local logger tree"""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+# Shared dict of job ids whose cancellation was requested (worker side)
+_cancelled_jobs = None
+
+
+def cancel_requested() -> bool:
+    """True if the job running in the current context was asked to stop"""
+    job_id = current_job_id()
+    return (
+        _cancelled_jobs is not None and job_id is not None and job_id in _cancelled_jobs
+    )
+
+
+def _init_worker(log_queue, cancelled_jobs):
+    """Route every log record of the worker process to the parent's queue"""
+    global _cancelled_jobs
+    _cancelled_jobs = cancelled_jobs
+
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(JobContextFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+    log_capture.install()
+
+
+def _run_job(job_id: str, fn: Callable, *args):
+    """Worker entry point: run ``fn`` with its output tagged by job id"""
+    with job_context(job_id):
+        return fn(*args)
+
+
+class JobManager:
+    """Submit callables to a process pool and track them by job id"""
+
+    def __init__(self, max_workers: int, max_finished_jobs: int):
+        self.max_workers = max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._log_queue = None
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
+        self._manager = None
+        self._cancelled_jobs = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        # spawn keeps workers free of the parent's threads and event loop
+        ctx = multiprocessing.get_context("spawn")
+        self._log_queue = ctx.Queue()
+        self._log_listener = logging.handlers.QueueListener(
+            self._log_queue, _RecordDispatcher()
+        )
+        self._log_listener.start()
+        self._manager = ctx.Manager()
+        self._cancelled_jobs = self._manager.dict()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self._log_queue, self._cancelled_jobs),
+        )
+        logger.info(f"⚙️  Job pool started with {self.max_workers} workers")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+            self._cancelled_jobs = None
+
+    def submit(self, kind: str, fn: Callable, *args, keep_result: bool = False) -> Job:
+        """
+        Queue ``fn(*args)``. The caller awaits ``job.future`` for the result;
+        the registry only keeps it with ``keep_result``, otherwise finished
+        jobs are listed with their status alone.
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        future = self._executor.submit(_run_job, job_id, fn, *args)
+        job = Job(id=job_id, kind=kind, future=future, keep_result=keep_result)
+        future.add_done_callback(lambda _: self._on_done(job))
+        with self._lock:
+            self._jobs[job.id] = job
+        logger.info(f"📥 Job {job.id} queued ({kind})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job: Job):
+        """Cancel a pending job, or ask a running one to stop early"""
+        if job.future.done():
+            return
+        job.cancel_requested = True
+        if job.future.cancel():
+            logger.info(f"🛑 Job {job.id} cancelled before starting")
+            return
+        self._cancelled_jobs[job.id] = True
+        logger.info(f"🛑 Cancellation requested for job {job.id}")
+
+    def _on_done(self, job: Job):
+        job.finished_at = time.time()
+        if self._cancelled_jobs is not None:
+            self._cancelled_jobs.pop(job.id, None)
+        with self._lock:
+            if not job.keep_result and job.id in self._jobs:
+                # The caller holds the result; do not pin it here
+                self._jobs[job.id] = job.without_result()
+            finished = [j for j in self._jobs.values() if j.future.done()]
+            for old in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+                del self._jobs[old.id]
+
+
+job_manager = JobManager(
+    max_workers=int(os.environ.get("SEARCH_WORKERS", DEFAULT_MAX_WORKERS)),
+    max_finished_jobs=int(
+        os.environ.get("MAX_FINISHED_JOBS", DEFAULT_MAX_FINISHED_JOBS)
+    ),
+)
@@ -0,0 +1,190 @@
+"""
+Concurrency-safe capture of the core's print() output.
+
+diversity.py reports progress with print() and asks confirmations with
+input(). Swapping sys.stdout/sys.stdin per request breaks as soon as two
+requests overlap in threads, so instead a single proxy stream is installed
+once per process and routes each write according to a context variable:
+inside ``core_output(...)`` lines go to the logger of the current context and
+are tagged with the current job id; outside, writes reach the real stream.
+
+Every log record emitted within ``job_context(job_id)`` carries a ``job_id``
+attribute (see JobContextFilter), which JobLogBuffer uses to keep a separate
+log buffer per job.
+"""
+
+import io
+import logging
+import sys
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+DEFAULT_MAX_LINES_PER_JOB = 5000
+DEFAULT_MAX_JOBS = 100
+
+_job_id: ContextVar[Optional[str]] = ContextVar("job_id", default=None)
+_sink: ContextVar[Optional["StdoutToLogger"]] = ContextVar("core_output", default=None)
+_install_lock = threading.Lock()
+
+
+def current_job_id() -> Optional[str]:
+    return _job_id.get()
+
+
+@contextmanager
+def job_context(job_id: str):
+    """Tag everything logged or printed in this context with ``job_id``"""
+    token = _job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+class StdoutToLogger:
+    """
+    Captures stdout prints and forwards them to logging system.
+    This allows us to capture print() statements from diversity.py.
+    """
+
+    def __init__(self, logger_instance, log_level=logging.INFO, source="CORE"):
+        self.logger = logger_instance
+        self.log_level = log_level
+        self.source = source
+        self.linebuf = ""
+
+    def write(self, buf):
+        self.linebuf += buf
+        *lines, self.linebuf = self.linebuf.split("\n")
+        for line in lines:
+            self._emit(line)
+
+    def flush(self):
+        if self.linebuf:
+            self._emit(self.linebuf)
+            self.linebuf = ""
+
+    def _emit(self, line):
+        line = line.rstrip()
+        if line:
+            # Add source prefix to distinguish core logs
+            self.logger.log(
+                self.log_level,
+                f"[{self.source}] {line}",
+                extra={"job_id": current_job_id()},
+            )
+
+
+class _ContextStdout(io.TextIOBase):
+    """sys.stdout proxy writing to the current context's sink, if any"""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def write(self, buf):
+        sink = _sink.get()
+        if sink is None:
+            return self.fallback.write(buf)
+        sink.write(buf)
+        return len(buf)
+
+    def flush(self):
+        sink = _sink.get()
+        if sink is None:
+            self.fallback.flush()
+
+    def isatty(self):
+        return _sink.get() is None and self.fallback.isatty()
+
+    def fileno(self):
+        return self.fallback.fileno()
+
+
+class _ContextStdin(io.TextIOBase):
+    """sys.stdin proxy answering 'y' to every core prompt inside core_output()"""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def readline(self, size=-1):
+        if _sink.get() is None:
+            return self.fallback.readline(size)
+        return "y\n"
+
+    def read(self, size=-1):
+        if _sink.get() is None:
+            return self.fallback.read(size)
+        return "y\n"
+
+
+def install():
+    """Install the stdout/stdin proxies for this process (idempotent)"""
+    with _install_lock:
+        if not isinstance(sys.stdout, _ContextStdout):
+            sys.stdout = _ContextStdout(sys.stdout)
+        if not isinstance(sys.stdin, _ContextStdin):
+            sys.stdin = _ContextStdin(sys.stdin)
+
+
+@contextmanager
+def core_output(logger_instance, log_level=logging.INFO):
+    """
+    Route print() output to ``logger_instance`` and auto-confirm input()
+    prompts, for the current thread/task only.
+    """
+    install()
+    sink = StdoutToLogger(logger_instance, log_level)
+    token = _sink.set(sink)
+    try:
+        yield sink
+    finally:
+        sink.flush()
+        _sink.reset(token)
+
+
+class JobContextFilter(logging.Filter):
+    """Attach the current job id to records that do not have one yet"""
+
+    def filter(self, record):
+        if getattr(record, "job_id", None) is None:
+            record.job_id = current_job_id()
+        return True
+
+
+class JobLogBuffer(logging.Handler):
+    """Keep the most recent log lines of each job, keyed by job id"""
+
+    def __init__(
+        self,
+        max_lines: int = DEFAULT_MAX_LINES_PER_JOB,
+        max_jobs: int = DEFAULT_MAX_JOBS,
+    ):
+        super().__init__()
+        self.max_lines = max_lines
+        self.max_jobs = max_jobs
+        self._buffers: "OrderedDict[str, deque]" = OrderedDict()
+        self.addFilter(JobContextFilter())
+
+    def emit(self, record):
+        job_id = getattr(record, "job_id", None)
+        if job_id is None:
+            return
+        line = self.format(record).replace("[CORE] ", "", 1)
+        with self.lock:
+            buffer = self._buffers.get(job_id)
+            if buffer is None:
+                buffer = self._buffers[job_id] = deque(maxlen=self.max_lines)
+                while len(self._buffers) > self.max_jobs:
+                    self._buffers.popitem(last=False)
+            buffer.append(line)
+
+    def get_lines(self, job_id: str) -> Optional[List[str]]:
+        with self.lock:
+            buffer = self._buffers.get(job_id)
+            return list(buffer) if buffer is not None else None
+
+
+job_log_buffer = JobLogBuffer()
@@ -0,0 +1,168 @@
+"""
+WebSocket log streaming with per-job channels, backpressure and batching.
+
+Log records are staged in a thread-safe deque and drained on the event loop
+by a single scheduled callback, instead of one asyncio task per line. Each
+connection owns a bounded queue (oldest lines dropped when a slow client
+falls behind) and a sender task that flushes everything accumulated during a
+short time window as one frame, lines separated by newlines.
+
+Subscribers either follow one job (``/ws/jobs/{job_id}/logs``: every record
+tagged with that job id) or the global channel (``/ws/logs``: [CORE] lines
+of all jobs, as before). Structured progress events (see progress.py) go to
+the ``progress`` stream of their job as newline-delimited JSON.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from app.log_capture import JobContextFilter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL_MS = 100
+DEFAULT_MAX_QUEUE = 1000
+
+CORE_PREFIX = "[CORE]"
+
+LOGS_STREAM = "logs"
+PROGRESS_STREAM = "progress"
+
+
+class LogSubscriber:
+    """One WebSocket connection with its bounded, batched send queue"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: deque = deque(maxlen=max_queue)
+        self.dropped = 0
+        self._wakeup = asyncio.Event()
+
+    def push(self, line: str):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(line)
+        self._wakeup.set()
+
+    async def run(self, flush_interval: float):
+        """Send queued lines, one frame per time window, until cancelled"""
+        while True:
+            await self._wakeup.wait()
+            # Let the window fill up before sending a single frame
+            await asyncio.sleep(flush_interval)
+            self._wakeup.clear()
+
+            lines = list(self.queue)
+            self.queue.clear()
+            if self.dropped:
+                lines.insert(
+                    0, f"|⚠️ {self.dropped} log lines dropped (client too slow)"
+                )
+                self.dropped = 0
+            if lines:
+                try:
+                    await self.websocket.send_text("\n".join(lines))
+                except Exception:
+                    # Disconnected: the endpoint unsubscribes and cancels us
+                    return
+
+
+class LogHub(logging.Handler):
+    """Logging handler fanning records out to WebSocket subscribers"""
+
+    def __init__(self, flush_interval: float, max_queue: int):
+        super().__init__()
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Channels are keyed by (stream, job_id); job_id None is the global
+        # [CORE] channel
+        self._channels: Dict[Tuple[str, Optional[str]], Set[LogSubscriber]] = {}
+        self._staged: deque = deque()
+        self._drain_scheduled = False
+        self._stage_lock = threading.Lock()
+        self.addFilter(JobContextFilter())
+
+    def emit(self, record):
+        if self.loop is None or self.loop.is_closed() or not self._channels:
+            return
+
+        msg = record.getMessage()
+        job_id = getattr(record, "job_id", None)
+
+        event = getattr(record, "progress", None)
+        if event is not None and job_id is not None:
+            self._stage((PROGRESS_STREAM, job_id), json.dumps(event))
+
+        is_core = CORE_PREFIX in msg
+        if not is_core and job_id is None:
+            # API logs outside of any job are not streamed
+            return
+
+        clean_msg = msg.replace(CORE_PREFIX, "").strip()
+        if not clean_msg:
+            return
+
+        # Format: timestamp|message (simple pipe-separated format)
+        line = f"{self.format(record)}|{clean_msg}"
+        if job_id is not None:
+            self._stage((LOGS_STREAM, job_id), line)
+        if is_core:
+            self._stage((LOGS_STREAM, None), line)
+
+    def _stage(self, channel: Tuple[str, Optional[str]], line: str):
+        self._staged.append((channel, line))
+
+        with self._stage_lock:
+            if self._drain_scheduled:
+                return
+            self._drain_scheduled = True
+        try:
+            self.loop.call_soon_threadsafe(self._drain)
+        except RuntimeError:
+            # Loop closed during shutdown
+            pass
+
+    def _drain(self):
+        with self._stage_lock:
+            self._drain_scheduled = False
+        while self._staged:
+            channel, line = self._staged.popleft()
+            for subscriber in self._channels.get(channel, ()):
+                subscriber.push(line)
+
+    def subscribe(
+        self, websocket: WebSocket, job_id: Optional[str], stream: str = LOGS_STREAM
+    ) -> LogSubscriber:
+        subscriber = LogSubscriber(websocket, self.max_queue)
+        self._channels.setdefault((stream, job_id), set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(
+        self,
+        subscriber: LogSubscriber,
+        job_id: Optional[str],
+        stream: str = LOGS_STREAM,
+    ):
+        channel = self._channels.get((stream, job_id))
+        if channel is not None:
+            channel.discard(subscriber)
+            if not channel:
+                del self._channels[(stream, job_id)]
+
+    def connection_count(self) -> int:
+        return sum(len(channel) for channel in self._channels.values())
+
+
+log_hub = LogHub(
+    flush_interval=int(os.environ.get("LOG_FLUSH_MS", DEFAULT_FLUSH_INTERVAL_MS))
+    / 1000,
+    max_queue=int(os.environ.get("LOG_QUEUE_SIZE", DEFAULT_MAX_QUEUE)),
+)
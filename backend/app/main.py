@@ -4,22 +4,60 @@ FastAPI Backend for Phase Diversity Web Application
 Stateless compute gateway - all state managed by frontend
 """
 
-import io
 import sys
-import base64
+import json
+import asyncio
 import logging
-import time
-from typing import List, Optional, Dict, Any, Tuple
-from contextlib import asynccontextmanager, redirect_stdout
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
 
 import numpy as np
-from astropy.io import fits
-from PIL import Image
-from fastapi import FastAPI, File, UploadFile, WebSocket, HTTPException
+from fastapi import FastAPI, File, UploadFile, WebSocket, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-
-from app.core import diversity as div
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from app.image_store import image_store
+from app.ingest import load_flexible_image_collection
+from app.jobs import cancel_requested, job_manager
+from app.log_capture import job_log_buffer
+from app.log_stream import LOGS_STREAM, PROGRESS_STREAM, log_hub
+from app.progress import progress_tracker
+from app.models import (
+    BatchSearchRequest,
+    MultistartSearchRequest,
+    OpticalConfigRequest,
+    PreviewConfigRequest,
+    SearchPhaseRequest,
+    SweepRequest,
+    TimeSeriesRequest,
+)
+from app.multistart import StartPoint, summarize_starts
+from app.pipeline import (
+    calculate_config_info,
+    generate_opticsetup_thumbnails,
+    run_search,
+)
+from app.setup_cache import preview_setup_cache
+from app.sweep import (
+    INITIAL_FIELDS,
+    MAX_POINTS,
+    run_sweep_chain,
+    split_chains,
+    sweep_points,
+    sweep_size,
+)
+from app.stats import collection_stats, histogram
+from app.timeseries import TimeSeries, frame_size, split_frames
+from app.transport import (
+    add_request_schemas,
+    decode_npy,
+    multipart_response,
+    read_request_model,
+    request_body,
+    to_jsonable,
+    wants_binary,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,122 +66,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-active_websockets: List[WebSocket] = []
-
-
-class StdoutToLogger:
-    """
-    Captures stdout prints and forwards them to logging system.
-    This allows us to capture print() statements from diversity.py.
-    """
-
-    def __init__(self, logger_instance, log_level=logging.INFO, source="CORE"):
-        self.logger = logger_instance
-        self.log_level = log_level
-        self.source = source
-        self.linebuf = ""
-
-    def write(self, buf):
-        for line in buf.rstrip().splitlines():
-            # Add source prefix to distinguish core logs
-            self.logger.log(self.log_level, f"[{self.source}] {line.rstrip()}")
-
-    def flush(self):
-        sys.stdout.flush()
-
-
-class OpticalConfigRequest(BaseModel):
-    xc: Optional[int] = Field(
-        None, description="Center x coordinate (auto-detect if None)"
-    )
-    yc: Optional[int] = Field(
-        None, description="Center y coordinate (auto-detect if None)"
-    )
-    N: Optional[int] = Field(None, description="Computation size (auto-detect if None)")
-    defoc_z: List[float] = Field(..., description="Defocus values in meters")
-    pupilType: int = Field(0, description="0: disk, 1: polygon, 2: ELT")
-    flattening: float = Field(1.0, description="Pupil flattening (ellipticity)")
-    obscuration: float = Field(0.0, description="Central obscuration ratio")
-    angle: float = Field(0.0, description="Pupil rotation angle in degrees")
-    nedges: int = Field(0, description="Number of polygon edges (if pupilType=1)")
-    spiderAngle: float = Field(0.0, description="Spider rotation angle in degrees")
-    spiderArms: List[float] = Field(
-        default_factory=list, description="Spider arm widths"
-    )
-    spiderOffset: List[float] = Field(
-        default_factory=list, description="Spider arm offsets"
-    )
-    illum: List[float] = Field(
-        default_factory=lambda: [1.0], description="Illumination per image"
-    )
-    wvl: float = Field(550e-9, description="Wavelength in meters")
-    fratio: float = Field(18.0, description="Focal ratio (f-number)")
-    pixelSize: float = Field(7.4e-6, description="Pixel size in meters")
-    edgeblur_percent: float = Field(3.0, description="Edge blur percentage")
-    object_fwhm_pix: float = Field(
-        0.0, description="Object FWHM in pixels (0 = point source)"
-    )
-    object_shape: str = Field(
-        "gaussian", description="Object shape: gaussian, airy, etc."
-    )
-    basis: str = Field(
-        "eigen", description="Phase basis: eigen, eigenfull, zernike, or zonal"
-    )
-    Jmax: int = Field(55, description="Maximum number of phase modes")
-
-    # Initial values for continuation from previous run
-    initial_phase: Optional[List[float]] = Field(
-        None, description="Initial phase coefficients (from previous run)"
-    )
-    initial_illum: Optional[List[float]] = Field(
-        None, description="Initial illumination coefficients"
-    )
-    initial_defoc_z: Optional[List[float]] = Field(
-        None, description="Initial defocus values"
-    )
-    initial_optax_x: Optional[List[float]] = Field(
-        None, description="Initial optical axis X shifts"
-    )
-    initial_optax_y: Optional[List[float]] = Field(
-        None, description="Initial optical axis Y shifts"
-    )
-    initial_focscale: Optional[float] = Field(None, description="Initial focal scale")
-    initial_object_fwhm_pix: Optional[float] = Field(
-        None, description="Initial object FWHM"
-    )
-    initial_amplitude: Optional[List[float]] = Field(
-        None, description="Initial amplitude values"
-    )
-    initial_background: Optional[List[float]] = Field(
-        None, description="Initial background values"
-    )
-
-
-class PreviewConfigRequest(BaseModel):
-    images: List[List[List[float]]] = Field(..., description="3D image array [N, H, W]")
-    config: OpticalConfigRequest
-
-
-class SearchPhaseRequest(BaseModel):
-    images: List[List[List[float]]] = Field(..., description="3D image array [N, H, W]")
-    config: OpticalConfigRequest
-    defoc_z_flag: bool = Field(False, description="Fit defocus distances")
-    focscale_flag: bool = Field(False, description="Fit focal scale")
-    optax_flag: bool = Field(False, description="Fit optical axis shifts")
-    amplitude_flag: bool = Field(True, description="Fit image amplitudes")
-    background_flag: bool = Field(False, description="Fit background levels")
-    phase_flag: bool = Field(True, description="Fit phase aberrations")
-    illum_flag: bool = Field(False, description="Fit illumination")
-    objsize_flag: bool = Field(False, description="Fit object size")
-    estimate_snr: bool = Field(False, description="Estimate SNR for optimal weighting")
-    verbose: bool = Field(True, description="Verbose output")
-    tolerance: float = Field(1e-5, description="Convergence tolerance")
+# How often a synchronous search checks whether its client is still connected
+DISCONNECT_POLL_S = 0.5
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("🚀 Phase Diversity API starting up...")
+    log_hub.loop = asyncio.get_running_loop()
+    job_manager.start()
     yield
+    job_manager.shutdown()
     logger.info("👋 Phase Diversity API shutting down...")
 
 
@@ -154,6 +87,16 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+
+def openapi_schema():
+    """OpenAPI schema, with the request models of the JSON/multipart bodies"""
+    if app.openapi_schema is None:
+        add_request_schemas(FastAPI.openapi(app))
+    return app.openapi_schema
+
+
+app.openapi = openapi_schema
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -163,277 +106,54 @@ app.add_middleware(
 )
 
 
-class WebSocketHandler(logging.Handler):
-    def emit(self, record):
-        if not active_websockets:
-            return
-
-        # Only send logs that come from CORE (stdout redirects)
-        msg = record.getMessage()
-
-        if "[CORE]" not in msg:
-            # Skip API logs, only broadcast CORE logs
-            return
-
-        # Remove the [CORE] prefix as frontend doesn't need it
-        clean_msg = msg.replace("[CORE]", "").strip()
-
-        # Skip empty messages
-        if not clean_msg:
-            return
-
-        # Format: timestamp|message (simple pipe-separated format)
-        timestamp = self.format(record)
-        formatted_msg = f"{timestamp}|{clean_msg}"
-
-        import asyncio
-
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # Create task and immediately schedule it
-                asyncio.create_task(self.emit_async(formatted_msg))
-        except RuntimeError:
-            pass
-
-    async def emit_async(self, msg: str):
-        disconnected = []
-        for ws in active_websockets:
-            try:
-                await ws.send_text(msg)
-            except Exception:
-                disconnected.append(ws)
-
-        for ws in disconnected:
-            if ws in active_websockets:
-                active_websockets.remove(ws)
-
-
-ws_handler = WebSocketHandler()
-ws_handler.setFormatter(logging.Formatter("%(asctime)s"))
+log_hub.setFormatter(logging.Formatter("%(asctime)s"))
 
 # Attach to root logger ONLY to capture ALL logs (including from core modules)
 # Don't add to logger directly as it propagates to root, causing duplicates
 root_logger = logging.getLogger()
-root_logger.addHandler(ws_handler)
-
+root_logger.addHandler(log_hub)
 
-def serialize_header(header: fits.Header) -> Dict[str, Any]:
-    """Convertit un Header Astropy en un dict sérialisable en JSON."""
-    header_dict = {}
-    for key, value in header.items():
-        if key in ("COMMENT", "HISTORY"):
-            # Gérer les listes de commentaires/historique
-            header_dict[key] = list(value)
-        else:
-            # str() gère les types non-JSON comme 'Undefined'
-            header_dict[key] = str(value)
-    return header_dict
+# Per-job log lines, for GET /api/jobs/{job_id}/logs
+job_log_buffer.setFormatter(logging.Formatter("%(asctime)s|%(message)s"))
+root_logger.addHandler(job_log_buffer)
+root_logger.addHandler(progress_tracker)
 
 
-async def load_flexible_image_collection(
-    files: List[UploadFile],
-) -> Tuple[List[np.ndarray], List[Dict[str, Any]], Optional[str]]:
+def resolve_images(request, arrays: Dict[str, np.ndarray]) -> np.ndarray:
     """
-    Charge les images FITS de manière flexible.
-
-    Tente de charger entre 2 et 10 images 2D à partir de n'importe quelle
-    combinaison de fichiers, HDUs, ou cubes 3D.
-
-    Retourne : (liste_images, liste_infos, message_warning)
+    Return the request's image stack as float64, from JSON, NPY or the store,
+    restricted to request.image_indices if given
     """
+    if "images" in arrays:
+        img_array = arrays["images"]
+    elif request.images is not None:
+        img_array = np.array(request.images, dtype=np.float64)
+    elif request.image_id is not None:
+        stored = image_store.get(request.image_id)
+        if stored is None:
+            # Evicted or never uploaded: the client must re-send the stack
+            raise HTTPException(
+                status_code=404, detail=f"Unknown image_id: {request.image_id}"
+            )
+        img_array = stored
+    else:
+        raise HTTPException(status_code=400, detail="No images provided")
 
-    images_list = []
-    info_list = []  # Pour stocker le header et la source
-    warning = None
-
-    # Limites
-    MIN_IMAGES = 2
-    MAX_IMAGES = 10
-
-    # 1. Boucler sur chaque fichier envoyé
-    for file in files:
-        if not file.filename.endswith((".fits", ".fit")):
-            logger.warning(f"Fichier ignoré (non-FITS): {file.filename}")
-            continue
-
-        content = await file.read()
-
-        try:
-            with fits.open(io.BytesIO(content)) as hdul:
-                # 2. Boucler sur chaque HDU dans ce fichier
-                for hdu_index, hdu in enumerate(hdul):
-
-                    if not hdu.is_image or hdu.data is None:
-                        continue  # Ignorer les HDUs non-image ou vides
-
-                    data = hdu.data
-                    header = hdu.header
-
-                    # 3. Gérer les données (Cube 3D ou Image 2D)
-
-                    # Cas A: C'est un cube 3D (N, H, W)
-                    if data.ndim == 3:
-                        logger.info(
-                            f"Fichier {file.filename} [HDU {hdu_index}]: Détection d'un cube 3D {data.shape}"
-                        )
-                        for i in range(data.shape[0]):
-                            if len(images_list) >= MAX_IMAGES:
-                                warning = f"Limite de {MAX_IMAGES} images atteinte. Les images suivantes ont été ignorées."
-                                break
-
-                            images_list.append(data[i])
-                            info_list.append(
-                                {
-                                    "source_file": file.filename,
-                                    "source_hdu_index": hdu_index,
-                                    "header": serialize_header(
-                                        header
-                                    ),  # Utilise le header principal du cube
-                                }
-                            )
-
-                    # Cas B: C'est une image 2D (H, W)
-                    elif data.ndim == 2:
-                        logger.info(
-                            f"Fichier {file.filename} [HDU {hdu_index}]: Détection d'une image 2D {data.shape}"
-                        )
-                        if len(images_list) >= MAX_IMAGES:
-                            warning = f"Limite de {MAX_IMAGES} images atteinte. Les images suivantes ont été ignorées."
-                            break
-
-                        images_list.append(data)
-                        info_list.append(
-                            {
-                                "source_file": file.filename,
-                                "source_hdu_index": hdu_index,
-                                "header": serialize_header(
-                                    header
-                                ),  # Header spécifique à cette image
-                            }
-                        )
-
-                    if warning:
-                        break  # Sortir de la boucle des HDUs
-            if warning:
-                break  # Sortir de la boucle des Fichiers
-
-        except Exception as e:
-            logger.error(f"Erreur à la lecture de {file.filename}: {e}")
-            # On continue avec les autres fichiers
-            pass
-
-    # 4. Validation finale des contraintes
-    if len(images_list) < MIN_IMAGES:
+    if img_array.ndim != 3:
         raise HTTPException(
             status_code=400,
-            detail=f"Au moins {MIN_IMAGES} images sont requises. {len(images_list)} seulement ont été trouvées.",
-        )
-
-    logger.info(f"Chargement terminé. {len(images_list)} images collectées.")
-    return images_list, info_list, warning
-
-
-def generate_thumbnail(image_2d: np.ndarray, size: int = 128) -> str:
-    """Generate base64 PNG thumbnail from 2D numpy array
-
-    Core algorithm uses [x, y] convention, but PIL expects [height, width] = [y, x].
-    We transpose to match PIL's expected format and flip vertically to get origin='lower' effect.
-    """
-    if image_2d.size == 0:
-        raise ValueError("Cannot generate thumbnail from empty array")
-
-    img_min, img_max = image_2d.min(), image_2d.max()
-    if img_max > img_min:
-        img_normalized = ((image_2d - img_min) / (img_max - img_min) * 255).astype(
-            np.uint8
+            detail=f"Images must be a 3D array [N, H, W], got shape {img_array.shape}",
         )
-    else:
-        img_normalized = np.full_like(image_2d, 128, dtype=np.uint8)
-
-    # Transpose from [x, y] to [y, x] and flip vertically to match origin='lower'
-    img_normalized = np.flipud(img_normalized.T)
-
-    img_pil = Image.fromarray(img_normalized)
-    img_pil.thumbnail((size, size), Image.Resampling.LANCZOS)
-
-    buffer = io.BytesIO()
-    img_pil.save(buffer, format="PNG")
-    img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-    return f"data:image/png;base64,{img_base64}"
-
-
-def generate_opticsetup_thumbnails(opticsetup):
-    """Generate both pupil and illumination thumbnails from an Opticsetup instance"""
-    pupil_image = generate_thumbnail(opticsetup.pupilmap, size=256)
-    illumination_map = opticsetup.mappy(opticsetup.pupillum)
-    illumination_image = generate_thumbnail(illumination_map, size=256)
-    return pupil_image, illumination_image
-
-
-def calculate_config_info(opticsetup, config):
-    """Calculate configuration information from an Opticsetup instance"""
-    sampling_factor = config.wvl * config.fratio / config.pixelSize
-    nphi = opticsetup.idx[0].size
-
-    if opticsetup.basis_type in ["eigen", "zernike"]:
-        phase_modes = opticsetup.phase_basis.shape[1]
-    elif opticsetup.basis_type == "eigenfull":
-        phase_modes = opticsetup.phase_basis.shape[1]
-    else:  # zonal
-        phase_modes = nphi
-
-    return {
-        "pdiam": float(opticsetup.pdiam),
-        "nphi": int(nphi),
-        "sampling_factor": float(sampling_factor),
-        "computation_format": f"{opticsetup.N}x{opticsetup.N}",
-        "data_format": f"{opticsetup.Ncrop}x{opticsetup.Ncrop}",
-        "basis_type": opticsetup.basis_type,
-        "phase_modes": int(phase_modes),
-    }
-
-
-def create_opticsetup_with_mocked_io(img_array: np.ndarray, config, logger):
-    """Create Opticsetup with stdin mocked and stdout redirected to logger"""
-    from io import StringIO
-
-    old_stdin = sys.stdin
-    old_stdout = sys.stdout
-
-    try:
-        sys.stdin = StringIO("y\n" * 100)
-        sys.stdout = StdoutToLogger(logger)
-
-        opticsetup = div.Opticsetup(
-            img_collection=img_array,
-            xc=config.xc,
-            yc=config.yc,
-            N=config.N,
-            defoc_z=config.defoc_z,
-            pupilType=config.pupilType,
-            flattening=config.flattening,
-            obscuration=config.obscuration,
-            angle=config.angle,
-            nedges=config.nedges,
-            spiderAngle=config.spiderAngle,
-            spiderArms=config.spiderArms,
-            spiderOffset=config.spiderOffset,
-            illum=config.illum,
-            wvl=config.wvl,
-            fratio=config.fratio,
-            pixelSize=config.pixelSize,
-            edgeblur_percent=config.edgeblur_percent,
-            object_fwhm_pix=config.object_fwhm_pix,
-            object_shape=config.object_shape,
-            basis=config.basis,
-            Jmax=config.Jmax,
-        )
-        return opticsetup
-    finally:
-        sys.stdin = old_stdin
-        sys.stdout = old_stdout
+    if request.image_indices is not None:
+        indices = np.asarray(request.image_indices, dtype=np.intp)
+        if indices.size == 0 or np.any((indices < 0) | (indices >= len(img_array))):
+            raise HTTPException(
+                status_code=400,
+                detail=f"image_indices must select images in [0, {len(img_array) - 1}]",
+            )
+        # Only the selected planes of a stored (memory-mapped) stack are read
+        img_array = img_array[indices]
+    return np.asarray(img_array, dtype=np.float64)
 
 
 @app.get("/")
@@ -444,58 +164,47 @@ async def root():
 @app.post(
     "/api/parse-images", response_model=None
 )  # response_model=None pour flexibilité
-async def parse_images(files: List[UploadFile] = File(...)):
+async def parse_images(request: Request, files: List[UploadFile] = File(...)):
     """
-    Charge une collection d'images FITS (min 2, max 10) pour la diversité de phase.
+    Charge une collection d'images (min 2, max MAX_IMAGES, 100 par défaut)
+    pour la diversité de phase.
     Retourne la pile d'images 3D, les statistiques globales, et les métadonnées
     (source_file, source_hdu_index, header) pour chaque image.
+
+    Avec `Accept: multipart/form-data`, la pile est renvoyée en NPY binaire.
+    La pile est aussi conservée côté serveur : l'`image_id` renvoyé peut
+    remplacer `images` dans les requêtes preview-config et search-phase.
     """
     try:
-        # 1. Charger la collection
-        images_list, info_list, warning = await load_flexible_image_collection(files)
-
-        # 2. Valider la cohérence des dimensions (H, W)
-        # C'est crucial pour la diversité de phase
-        first_shape = images_list[0].shape
-        shape_consistent = True
-        for img in images_list[1:]:
-            if img.shape != first_shape:
-                shape_consistent = False
-                logger.warning(
-                    f"Incohérence de dimensions: {first_shape} vs {img.shape}"
-                )
-                # Selon vos besoins, vous pourriez vouloir lever une erreur ici
-                # raise HTTPException(400, "Toutes les images doivent avoir les mêmes dimensions (H, W)")
-
-        # 3. Empiler (Stack) en un seul tableau 3D
-        try:
-            img_collection = np.array(images_list)
-        except ValueError as e:
-            # Cette erreur se produit si les formes ne sont vraiment pas compatibles
-            raise HTTPException(
-                status_code=400,
-                detail=f"Impossible d'empiler les images (dimensions incohérentes) : {e}",
-            )
-
-        original_dtype = str(img_collection.dtype)
-
-        # 4. Conversion et Traitement
-        img_collection_float = img_collection.astype(np.float64)
+        # 1. Charger la collection, directement en une pile 3D float
+        # (fichiers mis en tampon sur disque et lus par memmap, voir ingest.py)
+        collection = await load_flexible_image_collection(files)
+        img_collection_float = collection.images
+        info_list = collection.image_info
+        warning = collection.warning
         logger.info(
-            f"Collection créée: {img_collection_float.shape}, convertie de {original_dtype} à float64"
+            f"Collection créée: {img_collection_float.shape}, convertie de {collection.original_dtype} à {img_collection_float.dtype}"
         )
 
         # 5. Préparer la réponse
 
-        # 5a. Statistiques Globales
+        # 5a. Statistiques globales et par image, calculées pendant la copie
+        # (une seule passe, voir stats.py) ; l'histogramme sert à l'affichage
+        global_stats = collection_stats(collection.image_stats)
+        global_summary = global_stats.summary()
         stats = {
             "shape": list(img_collection_float.shape),
-            "global_min": float(img_collection_float.min()),
-            "global_max": float(img_collection_float.max()),
-            "global_mean": float(img_collection_float.mean()),
-            "global_std": float(img_collection_float.std()),
-            "original_dtype": original_dtype,
-            "shape_consistent": shape_consistent,
+            "global_min": global_summary["min"],
+            "global_max": global_summary["max"],
+            "global_mean": global_summary["mean"],
+            "global_std": global_summary["std"],
+            "global_nonfinite": global_summary["nonfinite"],
+            "original_dtype": collection.original_dtype,
+            "shape_consistent": collection.shape_consistent,
+            "per_image": [s.summary() for s in collection.image_stats],
+            "histogram": histogram(
+                img_collection_float, global_stats.min, global_stats.max
+            ),
         }
 
         # 5b. Informations par image (Métadonnées seulement)
@@ -506,13 +215,20 @@ async def parse_images(files: List[UploadFile] = File(...)):
             f"Métadonnées préparées pour {len(processed_image_info)} images."
         )
 
+        # 5c. Stockage adressé par contenu, pour ne plus renvoyer la pile
+        image_id = image_store.put(img_collection_float)
+
         # 6. Retourner la réponse finale
-        return {
-            "images": img_collection_float.tolist(),  # Le gros tableau de données
+        response = {
+            "image_id": image_id,
+            "images": img_collection_float,  # Le gros tableau de données
             "stats": stats,
             "image_info": processed_image_info,
             "warning": warning,
         }
+        if wants_binary(request):
+            return multipart_response(response)
+        return to_jsonable(response)
 
     except HTTPException:
         raise  # Renvoyer les erreurs 4xx gérées
@@ -521,8 +237,8 @@ async def parse_images(files: List[UploadFile] = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/preview-config")
-async def preview_config(request: PreviewConfigRequest):
+@app.post("/api/preview-config", openapi_extra=request_body(PreviewConfigRequest))
+async def preview_config(http_request: Request):
     """
     Preview optical configuration - stateless endpoint.
 
@@ -530,18 +246,21 @@ async def preview_config(request: PreviewConfigRequest):
     validation info, and warnings WITHOUT running search_phase.
 
     This is for real-time preview in the configuration UI with debouncing.
+    Accepts a PreviewConfigRequest as JSON, or as multipart/form-data with the
+    model in a 'request' field and the image stack in an 'images' NPY part.
     """
+    request, arrays = await read_request_model(http_request, PreviewConfigRequest)
+    img_array = resolve_images(request, arrays)
+
     try:
         logger.info(f"🔍 Previewing optical configuration...")
 
-        # Convert images from nested lists to numpy array
-        img_array = np.array(request.images, dtype=np.float64)
         logger.info(f"📊 Image array shape: {img_array.shape}")
 
         # Create Opticsetup instance
         logger.info(f"⚙️  Creating Opticsetup for preview...")
         config = request.config
-        opticsetup = create_opticsetup_with_mocked_io(img_array, config, logger)
+        opticsetup = preview_setup_cache.get_or_create(img_array, config)
         logger.info("✅ Opticsetup created for preview")
 
         # Generate thumbnails
@@ -566,8 +285,23 @@ async def preview_config(request: PreviewConfigRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/search-phase")
-async def search_phase(request: SearchPhaseRequest):
+async def wait_for_job(job, http_request: Request):
+    """Await a job's result, cancelling the job if the client disconnects"""
+    future = asyncio.wrap_future(job.future)
+    try:
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=DISCONNECT_POLL_S)
+            if done:
+                return future.result()
+            if await http_request.is_disconnected():
+                logger.warning(f"🔌 Client disconnected, cancelling job {job.id}")
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        job_manager.cancel(job)
+
+
+@app.post("/api/search-phase", openapi_extra=request_body(SearchPhaseRequest))
+async def search_phase(http_request: Request):
     """
     Complete phase diversity search - stateless endpoint.
 
@@ -576,267 +310,413 @@ async def search_phase(request: SearchPhaseRequest):
 
     This endpoint does NOT store anything - it's a pure compute function.
     Frontend is responsible for storing the results.
-    """
-    try:
-        start_time = time.time()
-        logger.info(f"🔬 Starting phase diversity search...")
 
-        # Convert images from nested lists to numpy array
-        img_array = np.array(request.images, dtype=np.float64)
-        logger.info(
-            f"📊 Image array shape: {img_array.shape}, dtype: {img_array.dtype}"
-        )
+    Accepts JSON or multipart/form-data (see /api/preview-config). With
+    `Accept: multipart/form-data` the result maps are returned as NPY parts.
 
-        # Create Opticsetup instance
-        logger.info(f"⚙️  Creating Opticsetup instance...")
-        config = request.config
-        opticsetup = create_opticsetup_with_mocked_io(img_array, config, logger)
-        logger.info("✅ Opticsetup created successfully")
-
-        # Inject initial values if provided (for continuation from previous run)
-        if config.initial_phase is not None:
-            opticsetup.phase = np.array(config.initial_phase)
-            logger.info(
-                f"   ↻ Continuing with initial phase ({len(config.initial_phase)} coefficients)"
-            )
-
-        if config.initial_illum is not None:
-            opticsetup.illum = config.initial_illum
-            logger.info(f"   ↻ Continuing with initial illumination")
+    The search runs as a job: its id is logged when queued (for
+    POST /api/jobs/{job_id}/cancel) and returned as `job_id`, and the job is
+    cancelled if the client disconnects.
+    """
+    request, arrays = await read_request_model(http_request, SearchPhaseRequest)
+    img_array = resolve_images(request, arrays)
 
-        if config.initial_defoc_z is not None:
-            opticsetup.defoc_z = np.array(config.initial_defoc_z)
-            logger.info(f"   ↻ Continuing with initial defoc_z")
+    # The fit runs in the job pool; awaiting it keeps the event loop free
+    job = job_manager.submit(
+        "search-phase", run_search, img_array, request, cancel_requested
+    )
+    logger.info(f"🧾 Search job {job.id} queued (POST /api/jobs/{job.id}/cancel)")
+    try:
+        response = await wait_for_job(job, http_request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Search error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    response["job_id"] = job.id
 
-        if config.initial_optax_x is not None:
-            opticsetup.optax_x = np.array(config.initial_optax_x)
-            logger.info(f"   ↻ Continuing with initial optax_x")
+    if wants_binary(http_request):
+        return multipart_response(response)
+    return to_jsonable(response)
 
-        if config.initial_optax_y is not None:
-            opticsetup.optax_y = np.array(config.initial_optax_y)
-            logger.info(f"   ↻ Continuing with initial optax_y")
 
-        if config.initial_focscale is not None:
-            opticsetup.focscale = config.initial_focscale
-            logger.info(
-                f"   ↻ Continuing with initial focscale={config.initial_focscale}"
-            )
+@app.post("/api/search-phase-multistart", openapi_extra=request_body(MultistartSearchRequest))
+async def search_phase_multistart(http_request: Request):
+    """
+    Run `starts` phase searches from different starting points in parallel
+    and return the lowest-chi2 solution with the spread of all of them.
 
-        if config.initial_object_fwhm_pix is not None:
-            opticsetup.object_fwhm_pix = config.initial_object_fwhm_pix
-            logger.info(
-                f"   ↻ Continuing with initial object_fwhm_pix={config.initial_object_fwhm_pix}"
-            )
+    Same body as /api/search-phase plus `starts`, `start_amplitude` and
+    `seed`. Start 0 is the request's own starting point; see app.multistart.
+    """
+    request, arrays = await read_request_model(http_request, MultistartSearchRequest)
+    img_array = resolve_images(request, arrays)
+
+    starts = [
+        StartPoint(index=i, amplitude=request.start_amplitude, seed=request.seed)
+        for i in range(request.starts)
+    ]
+    search_request = SearchPhaseRequest(
+        **request.model_dump(exclude={"starts", "start_amplitude", "seed"})
+    )
+    jobs = [
+        job_manager.submit(
+            "search-multistart",
+            run_search,
+            img_array,
+            search_request,
+            cancel_requested,
+            start,
+        )
+        for start in starts
+    ]
+    outcomes = await asyncio.gather(
+        *(asyncio.wrap_future(job.future) for job in jobs), return_exceptions=True
+    )
 
-        if config.initial_amplitude is not None:
-            opticsetup.amplitude = np.array(config.initial_amplitude)
-            logger.info(f"   ↻ Continuing with initial amplitude")
+    response = summarize_starts(starts, outcomes)
+    if not response["success"]:
+        raise HTTPException(status_code=500, detail=response["starts"])
+    logger.info(
+        f"🏁 Multi-start search: best start {response['best_start']} of {len(starts)}"
+    )
 
-        if config.initial_background is not None:
-            opticsetup.background = np.array(config.initial_background)
-            logger.info(f"   ↻ Continuing with initial background")
+    if wants_binary(http_request):
+        return multipart_response(response)
+    return to_jsonable(response)
 
-        # Generate thumbnails
-        pupil_image, illumination_image = generate_opticsetup_thumbnails(opticsetup)
 
-        # Calculate configuration info
-        config_info = calculate_config_info(opticsetup, config)
+@app.post(
+    "/api/search-phase-batch",
+    openapi_extra=request_body(
+        BatchSearchRequest,
+        {"datasets.0.images": "Image stack of dataset 0 as NPY (one part per dataset)"},
+    ),
+)
+async def search_phase_batch(http_request: Request):
+    """
+    Fit many image stacks with one optical config and one set of search flags.
 
-        logger.info(
-            f"   pdiam={config_info['pdiam']:.1f}, nphi={config_info['nphi']}, sampling={config_info['sampling_factor']:.2f}"
+    Each dataset (inline `images`, a stored `image_id`, or a
+    `datasets.<i>.images` NPY part) becomes a job in the worker pool. Results
+    are streamed as newline-delimited JSON, one line per dataset in completion
+    order, followed by a final summary line.
+    """
+    request, arrays = await read_request_model(http_request, BatchSearchRequest)
+    stacks = [
+        resolve_images(
+            dataset,
+            {"images": arrays[f"datasets.{i}.images"]}
+            if f"datasets.{i}.images" in arrays
+            else {},
+        )
+        for i, dataset in enumerate(request.datasets)
+    ]
+    search_request = SearchPhaseRequest(
+        **request.model_dump(exclude={"datasets", "images", "image_id"})
+    )
+    jobs = [
+        job_manager.submit(
+            "search-batch", run_search, img_array, search_request, cancel_requested
         )
+        for img_array in stacks
+    ]
+    logger.info(f"📦 Batch of {len(jobs)} searches queued")
 
-        # Run phase search with stdout redirected to capture print() statements
-        logger.info(f"🔍 Starting phase search...")
-        old_stdout_search = sys.stdout
+    async def wait(index: int):
         try:
-            sys.stdout = StdoutToLogger(logger)
-            opticsetup.search_phase(
-                defoc_z_flag=request.defoc_z_flag,
-                focscale_flag=request.focscale_flag,
-                optax_flag=request.optax_flag,
-                amplitude_flag=request.amplitude_flag,
-                background_flag=request.background_flag,
-                phase_flag=request.phase_flag,
-                illum_flag=request.illum_flag,
-                objsize_flag=request.objsize_flag,
-                estimate_snr=request.estimate_snr,
-                verbose=True,
-                tolerance=request.tolerance,
-            )
+            return index, await asyncio.wrap_future(jobs[index].future), None
+        except Exception as e:
+            return index, None, e
+
+    async def stream_results():
+        start = asyncio.get_running_loop().time()
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed([wait(i) for i in range(len(jobs))]):
+                index, result, error = await next_done
+                line = {
+                    "type": "result",
+                    "index": index,
+                    "name": request.datasets[index].name,
+                    "job_id": jobs[index].id,
+                    "status": jobs[index].status.value,
+                    "result": result,
+                    "error": str(error) if error is not None else None,
+                }
+                failed += error is not None
+                yield json.dumps(to_jsonable(line)) + "\n"
         finally:
-            sys.stdout = old_stdout_search
-        logger.info(f"✅ Phase search completed")
-
-        # Extract all results
-        phase_map = opticsetup.mappy(opticsetup.phase_generator(opticsetup.phase))
-
-        # Phase statistics calculations (matching diversity.py lines 1164-1184)
-        phi_pupil_nm = (
-            opticsetup.phase_generator(opticsetup.phase)
-            * opticsetup.wvl
-            / (2 * np.pi)
-            * 1e9
-        )
-        phi_pupil_nm_notilt = (
-            opticsetup.phase_generator(opticsetup.phase, tiptilt=False)
-            * opticsetup.wvl
-            / (2 * np.pi)
-            * 1e9
-        )
-        phi_pupil_nm_notiltdef = (
-            opticsetup.phase_generator(opticsetup.phase, tiptilt=False, defoc=False)
-            * opticsetup.wvl
-            / (2 * np.pi)
-            * 1e9
-        )
+            # Client went away mid-stream: do not leave the remaining fits running
+            for job in jobs:
+                job_manager.cancel(job)
+        yield json.dumps(
+            {
+                "type": "summary",
+                "datasets": len(jobs),
+                "succeeded": len(jobs) - failed,
+                "failed": failed,
+                "duration_ms": int((asyncio.get_running_loop().time() - start) * 1000),
+            }
+        ) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.post("/api/search-phase-sweep", openapi_extra=request_body(SweepRequest))
+async def search_phase_sweep(http_request: Request):
+    """
+    Fit the images for every point of a sweep over optical config fields and
+    return a table of final chi2 / RMS per point.
 
-        # RMS statistics
-        rms_value = float(np.std(phi_pupil_nm))
-        wrms_value = float(
-            np.sqrt(
-                np.sum(phi_pupil_nm**2 * opticsetup.pupillum)
-                / np.sum(opticsetup.pupillum)
-            )
+    Same body as /api/search-phase plus `sweep` ({field: [values]}), `mode`
+    (grid or zip) and `warm_start`. Points run in parallel chains; see
+    app.sweep.
+    """
+    request, arrays = await read_request_model(http_request, SweepRequest)
+    img_array = resolve_images(request, arrays)
+
+    unknown = [
+        field
+        for field in request.sweep
+        if field not in OpticalConfigRequest.model_fields or field in INITIAL_FIELDS
+    ]
+    if unknown or not request.sweep:
+        raise HTTPException(
+            status_code=400, detail=f"Cannot sweep config fields: {unknown}"
         )
-        rms_value_notilt = float(np.std(phi_pupil_nm_notilt))
-        wrms_value_notilt = float(
-            np.sqrt(
-                np.sum(phi_pupil_nm_notilt**2 * opticsetup.pupillum)
-                / np.sum(opticsetup.pupillum)
-            )
+    empty = [field for field, values in request.sweep.items() if not values]
+    if empty:
+        raise HTTPException(
+            status_code=400, detail=f"Sweep fields without values: {empty}"
         )
-        rms_value_notiltdef = float(np.std(phi_pupil_nm_notiltdef))
-        wrms_value_notiltdef = float(
-            np.sqrt(
-                np.sum(phi_pupil_nm_notiltdef**2 * opticsetup.pupillum)
-                / np.sum(opticsetup.pupillum)
+    try:
+        # Counted before the grid is built, so oversized sweeps cost nothing
+        n_points = sweep_size(request.sweep, request.mode)
+        if n_points > MAX_POINTS:
+            raise ValueError(
+                f"Sweep has {n_points} points, at most {MAX_POINTS} allowed"
             )
+        points = sweep_points(request.sweep, request.mode)
+        base = request.config.model_dump()
+        for point in points:
+            OpticalConfigRequest(**{**base, **point})
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    search_request = SearchPhaseRequest(
+        **request.model_dump(exclude={"sweep", "mode", "warm_start"})
+    )
+    jobs = [
+        job_manager.submit(
+            "search-sweep",
+            run_sweep_chain,
+            img_array,
+            search_request,
+            chain,
+            request.warm_start,
+            cancel_requested,
         )
+        for chain in split_chains(points, job_manager.max_workers)
+    ]
+    logger.info(f"🧭 Sweep of {len(points)} points in {len(jobs)} chains")
+    try:
+        chains = await asyncio.gather(*(asyncio.wrap_future(j.future) for j in jobs))
+    except Exception as e:
+        logger.error(f"❌ Sweep error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Phase maps (matching diversity.py lines 1212, 1221)
-        phase_map_notilt = opticsetup.mappy(phi_pupil_nm_notilt)
-        phase_map_notiltdef = opticsetup.mappy(phi_pupil_nm_notiltdef)
-
-        # Pupil illumination (matching diversity.py line 1230)
-        pupillum_map = opticsetup.mappy(opticsetup.pupillum)
-
-        # Tip/Tilt/Defocus statistics (matching diversity.py lines 1186-1203)
-        ttf = opticsetup.convert * opticsetup.phase[0:3]
-        a2_nmrms = float(ttf[0] * opticsetup.wvl / (2 * np.pi) * 1e9)
-        a2_lD = float(ttf[0] * 4 / (2 * np.pi))
-        a2_pix = float(ttf[0] * opticsetup.rad2pix)
-        a2_m = float(ttf[0] * opticsetup.rad2dist)
-        a3_nmrms = float(ttf[1] * opticsetup.wvl / (2 * np.pi) * 1e9)
-        a3_lD = float(ttf[1] * 4 / (2 * np.pi))
-        a3_pix = float(ttf[1] * opticsetup.rad2pix)
-        a3_m = float(ttf[1] * opticsetup.rad2dist)
-        a4_nmrms = float(ttf[2] * opticsetup.wvl / (2 * np.pi) * 1e9)
-        a4_pix = float(
-            ttf[2] * opticsetup.rad2z / opticsetup.fratio / opticsetup.pixelSize
-        )
-        a4_m = float(ttf[2] * opticsetup.rad2z)
-
-        # Compute model images and differences (matching visualize_images lines 1310-1316)
-        coeffs = opticsetup.encode_coefficients(
-            opticsetup.defoc_z,
-            opticsetup.focscale,
-            opticsetup.optax_x,
-            opticsetup.optax_y,
-            opticsetup.amplitude,
-            opticsetup.background,
-            opticsetup.phase,
-            opticsetup.illum,
-            opticsetup.object_fwhm_pix,
-        )
-        psfs = div.compute_psfs(opticsetup, coeffs)
-        model_images = np.reshape(psfs, opticsetup.img.shape)
-        image_differences = opticsetup.img - model_images
-
-        # Optical axis position in pixels (matching visualize_images lines 1318-1320)
-        cc = opticsetup.img.shape[1] / 2
-        k = (
-            4
-            * opticsetup.fratio
-            * (1 * opticsetup.wvl / 2 / np.pi)
-            / opticsetup.pixelSize
-        )
-        optax_x_pix = [float(cc - k * x) for x in opticsetup.optax_x]
-        optax_y_pix = [float(cc - k * y) for y in opticsetup.optax_y]
-
-        results = {
-            "phase": opticsetup.phase.tolist(),
-            "phase_map": phase_map.tolist(),
-            "phase_map_notilt": phase_map_notilt.tolist(),
-            "phase_map_notiltdef": phase_map_notiltdef.tolist(),
-            "pupilmap": opticsetup.pupilmap.tolist(),
-            "pupillum": pupillum_map.tolist(),
-            "defoc_z": opticsetup.defoc_z.tolist(),
-            "focscale": float(opticsetup.focscale),
-            "optax_x": opticsetup.optax_x.tolist(),
-            "optax_y": opticsetup.optax_y.tolist(),
-            "optax_pixels": {"x": optax_x_pix, "y": optax_y_pix},
-            "amplitude": opticsetup.amplitude.tolist(),
-            "background": opticsetup.background.tolist(),
-            "illum": opticsetup.illum,
-            "object_fwhm_pix": float(opticsetup.object_fwhm_pix),
-            "origin_images": opticsetup.img.tolist(),
-            "model_images": model_images.tolist(),
-            "image_differences": image_differences.tolist(),
-            "rms_stats": {
-                "raw": rms_value,
-                "weighted": wrms_value,
-                "raw_notilt": rms_value_notilt,
-                "weighted_notilt": wrms_value_notilt,
-                "raw_notiltdef": rms_value_notiltdef,
-                "weighted_notiltdef": wrms_value_notiltdef,
-            },
-            "tiptilt_defocus_stats": {
-                "tip": {
-                    "nm_rms": a2_nmrms,
-                    "lambda_D": a2_lD,
-                    "pixels": a2_pix,
-                    "mm": a2_m * 1e3,
-                },
-                "tilt": {
-                    "nm_rms": a3_nmrms,
-                    "lambda_D": a3_lD,
-                    "pixels": a3_pix,
-                    "mm": a3_m * 1e3,
-                },
-                "defocus": {"nm_rms": a4_nmrms, "pixels": a4_pix, "mm": a4_m * 1e3},
-            },
+    rows = [row for chain in chains for row in chain]
+    succeeded = [i for i, row in enumerate(rows) if row.get("error") is None]
+    best = min(succeeded, key=lambda i: rows[i]["chi2"]) if succeeded else None
+    return to_jsonable(
+        {
+            "success": best is not None,
+            "fields": list(request.sweep),
+            "rows": rows,
+            "best": rows[best] if best is not None else None,
         }
+    )
 
-        duration_ms = int((time.time() - start_time) * 1000)
-        logger.info(f"✅ Search complete in {duration_ms}ms")
-
-        return {
-            "success": True,
-            "config_info": config_info,
-            "pupil_image": pupil_image,
-            "illumination_image": illumination_image,
-            "results": results,
-            "duration_ms": duration_ms,
-        }
 
+@app.post(
+    "/api/search-phase-timeseries",
+    openapi_extra=request_body(
+        TimeSeriesRequest,
+        {"images": "Image stack [T * K, H, W], or cube [T, K, H, W], as NPY"},
+    ),
+)
+async def search_phase_timeseries(http_request: Request):
+    """
+    Fit a time series of frames in order, each frame starting from the
+    previous frame's solution.
+
+    Same body as /api/search-phase plus `images_per_frame` (default: one image
+    per defoc_z value) and `warm_start`. The stack holds the frames one after
+    the other; an `images` NPY part may also be a [T, K, H, W] cube. Rows are
+    streamed as newline-delimited JSON as each frame completes, followed by a
+    final summary line.
+    """
+    request, arrays = await read_request_model(http_request, TimeSeriesRequest)
+    if "images" in arrays and arrays["images"].ndim == 4:
+        cube = arrays["images"]
+        arrays["images"] = cube.reshape(-1, *cube.shape[2:])
+        if request.images_per_frame is None:
+            request.images_per_frame = cube.shape[1]
+    img_array = resolve_images(request, arrays)
+    try:
+        frames = split_frames(img_array, frame_size(request, request.images_per_frame))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    series = TimeSeries.from_request(request)
+    logger.info(f"🎞️  Time series of {len(frames)} frames")
+
+    async def stream_results():
+        start = asyncio.get_running_loop().time()
+        for frame in frames:
+            row = await fit_frame(series, frame)
+            yield json.dumps(to_jsonable({"type": "frame", **row})) + "\n"
+        yield json.dumps(
+            {
+                "type": "summary",
+                **series.summary(),
+                "duration_ms": int((asyncio.get_running_loop().time() - start) * 1000),
+            }
+        ) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+async def fit_frame(series: TimeSeries, frame: np.ndarray) -> Dict:
+    """Fit one frame of a time series in the worker pool and record its row"""
+    job = job_manager.submit(
+        "search-timeseries", run_search, frame, series.next_request(), cancel_requested
+    )
+    try:
+        response = await asyncio.wrap_future(job.future)
+    except asyncio.CancelledError:
+        # Client went away: do not leave the fit running
+        job_manager.cancel(job)
+        raise
     except Exception as e:
-        logger.error(f"❌ Search error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        return series.record_error(e)
+    return series.record(response)
+
+
+@app.post("/api/jobs/search-phase", openapi_extra=request_body(SearchPhaseRequest))
+async def submit_search_job(http_request: Request):
+    """
+    Queue a phase search and return immediately with its job id.
+
+    Same body as /api/search-phase. Poll GET /api/jobs/{job_id} for the status
+    and, once done, the results.
+    """
+    request, arrays = await read_request_model(http_request, SearchPhaseRequest)
+    img_array = resolve_images(request, arrays)
+
+    job = job_manager.submit(
+        "search-phase",
+        run_search,
+        img_array,
+        request,
+        cancel_requested,
+        keep_result=True,
+    )
+    return job.summary()
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, http_request: Request):
+    """
+    Return a job's status; results are included once the job is done.
+
+    With `Accept: multipart/form-data` the result maps are returned as NPY parts.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    response = job.summary()
+    response["progress"] = progress_tracker.latest(job_id)
+    if job.has_result:
+        response["result"] = job.future.result()
+
+    if wants_binary(http_request):
+        return multipart_response(response)
+    return to_jsonable(response)
+
+
+@app.get("/api/images/{image_id}")
+async def get_image_info(image_id: str):
+    """Check whether a stored stack is still available, and return its shape"""
+    stored = image_store.get(image_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Unknown image_id: {image_id}")
+    return {
+        "image_id": image_id,
+        "shape": list(stored.shape),
+        "dtype": str(stored.dtype),
+    }
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel a job. A queued job never starts; a running search stops at its
+    next model evaluation and returns the best coefficients found so far,
+    with `truncated` set in its result.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    job_manager.cancel(job)
+    return job.summary()
+
+
+@app.get("/api/jobs/{job_id}/logs")
+async def get_job_logs(job_id: str):
+    """Return the log lines of one job, as 'timestamp|message' strings"""
+    lines = job_log_buffer.get_lines(job_id)
+    if lines is None and job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return {"job_id": job_id, "lines": lines or []}
 
 
 # All old session-based endpoints removed - backend is now fully stateless
 # Frontend manages all state in localStorage
 
 
+async def stream_logs(
+    websocket: WebSocket, job_id: Optional[str], stream: str = LOGS_STREAM
+):
+    """Subscribe a connection to a log channel until it disconnects"""
+    subscriber = log_hub.subscribe(websocket, job_id, stream)
+    sender = asyncio.create_task(subscriber.run(log_hub.flush_interval))
+    logger.info(
+        f"🔌 WebSocket connected. Active connections: {log_hub.connection_count()}"
+    )
+
+    try:
+        while True:
+            # Keep connection alive and allow client to send pings
+            await websocket.receive_text()
+    except Exception as e:
+        logger.info(f"🔌 WebSocket disconnected: {str(e)}")
+    finally:
+        sender.cancel()
+        log_hub.unsubscribe(subscriber, job_id, stream)
+
+
 @app.websocket("/ws/logs")
 async def websocket_logs(websocket: WebSocket):
     """
     WebSocket endpoint for streaming logs in real-time.
+
+    Streams the [CORE] lines of every job. Frames hold one or more
+    'timestamp|message' lines separated by newlines.
     """
     await websocket.accept()
-    active_websockets.append(websocket)
-    logger.info(f"🔌 WebSocket connected. Active connections: {len(active_websockets)}")
 
     # Send a welcome message - this is a SYSTEM message, not CORE
     import datetime
@@ -846,15 +726,112 @@ async def websocket_logs(websocket: WebSocket):
         f"{welcome_timestamp}|✅ Connected to Phase Diversity Backend"
     )
 
+    await stream_logs(websocket, None)
+
+
+@app.websocket("/ws/jobs/{job_id}/logs")
+async def websocket_job_logs(websocket: WebSocket, job_id: str):
+    """
+    WebSocket endpoint streaming the logs of a single job.
+
+    Lines already logged by the job are replayed first, then new ones follow
+    in batched frames (newline-separated 'timestamp|message' lines).
+    """
+    await websocket.accept()
+    if job_manager.get(job_id) is None:
+        await websocket.close(code=4404, reason=f"Unknown job: {job_id}")
+        return
+
+    history = job_log_buffer.get_lines(job_id)
+    if history:
+        await websocket.send_text("\n".join(history))
+
+    await stream_logs(websocket, job_id)
+
+
+@app.websocket("/ws/jobs/{job_id}/progress")
+async def websocket_job_progress(websocket: WebSocket, job_id: str):
+    """
+    WebSocket endpoint streaming structured progress events of a single job.
+
+    Frames hold one or more JSON events separated by newlines, one per trial
+    step of the optimizer (iteration, chi2, step_norm, elapsed_ms, ...).
+    """
+    await websocket.accept()
+    if job_manager.get(job_id) is None:
+        await websocket.close(code=4404, reason=f"Unknown job: {job_id}")
+        return
+
+    latest = progress_tracker.latest(job_id)
+    if latest is not None:
+        await websocket.send_text(json.dumps(latest))
+
+    await stream_logs(websocket, job_id, PROGRESS_STREAM)
+
+
+@app.websocket("/ws/search-phase-timeseries")
+async def websocket_timeseries(websocket: WebSocket):
+    """
+    WebSocket endpoint fitting frames as they are pushed.
+
+    The first message is a JSON TimeSeriesRequest (config and search flags;
+    images are ignored). Each following binary message is one frame, an NPY
+    array [K, H, W], answered by a JSON row once fitted; frames are fitted in
+    order, each starting from the previous solution. Sending the text "end"
+    returns a summary line and closes the connection.
+    """
+    await websocket.accept()
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        return
+    if message.get("text") is None:
+        # 1003: unsupported data (a binary frame before the JSON request)
+        await websocket.close(code=1003, reason="First message must be a JSON request")
+        return
+    try:
+        request = TimeSeriesRequest.model_validate_json(message["text"])
+    except ValidationError as e:
+        await websocket.close(code=4400, reason=str(e)[:120])
+        return
+    series = TimeSeries.from_request(request)
+    expected = frame_size(request, request.images_per_frame)
+    logger.info("🎞️  Time series stream opened")
+
     try:
         while True:
-            # Keep connection alive and allow client to send pings
-            await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                if message["text"].strip() == "end":
+                    await websocket.send_text(
+                        json.dumps({"type": "summary", **series.summary()})
+                    )
+                    await websocket.close()
+                    break
+                continue
+            try:
+                frame = decode_npy(message["bytes"])
+            except HTTPException as e:
+                await websocket.send_text(
+                    json.dumps({"type": "error", "error": e.detail})
+                )
+                continue
+            if frame.ndim != 3 or len(frame) != expected:
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "type": "error",
+                            "error": f"Frames must be [{expected}, H, W] arrays, "
+                            f"got shape {frame.shape}",
+                        }
+                    )
+                )
+                continue
+            row = await fit_frame(series, np.asarray(frame, dtype=np.float64))
+            await websocket.send_text(json.dumps(to_jsonable({"type": "frame", **row})))
     except Exception as e:
-        logger.info(f"🔌 WebSocket disconnected: {str(e)}")
-    finally:
-        if websocket in active_websockets:
-            active_websockets.remove(websocket)
+        logger.info(f"🔌 Time series stream closed: {str(e)}")
 
 
 # Helper functions defined above for Opticsetup creation and data processing
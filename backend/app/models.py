@@ -0,0 +1,211 @@
+"""
+Request models shared by the API endpoints and the search workers
+"""
+
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# Image-sized arrays of the search results, returned only when requested
+ResultArray = Literal[
+    "phase_map",
+    "phase_map_notilt",
+    "phase_map_notiltdef",
+    "pupilmap",
+    "pupillum",
+    "origin_images",
+    "model_images",
+    "image_differences",
+]
+
+
+class OpticalConfigRequest(BaseModel):
+    xc: Optional[int] = Field(
+        None, description="Center x coordinate (auto-detect if None)"
+    )
+    yc: Optional[int] = Field(
+        None, description="Center y coordinate (auto-detect if None)"
+    )
+    N: Optional[int] = Field(None, description="Computation size (auto-detect if None)")
+    defoc_z: List[float] = Field(..., description="Defocus values in meters")
+    pupilType: int = Field(0, description="0: disk, 1: polygon, 2: ELT")
+    flattening: float = Field(1.0, description="Pupil flattening (ellipticity)")
+    obscuration: float = Field(0.0, description="Central obscuration ratio")
+    angle: float = Field(0.0, description="Pupil rotation angle in degrees")
+    nedges: int = Field(0, description="Number of polygon edges (if pupilType=1)")
+    spiderAngle: float = Field(0.0, description="Spider rotation angle in degrees")
+    spiderArms: List[float] = Field(
+        default_factory=list, description="Spider arm widths"
+    )
+    spiderOffset: List[float] = Field(
+        default_factory=list, description="Spider arm offsets"
+    )
+    illum: List[float] = Field(
+        default_factory=lambda: [1.0], description="Illumination per image"
+    )
+    wvl: float = Field(550e-9, description="Wavelength in meters")
+    fratio: float = Field(18.0, description="Focal ratio (f-number)")
+    pixelSize: float = Field(7.4e-6, description="Pixel size in meters")
+    edgeblur_percent: float = Field(3.0, description="Edge blur percentage")
+    object_fwhm_pix: float = Field(
+        0.0, description="Object FWHM in pixels (0 = point source)"
+    )
+    object_shape: str = Field(
+        "gaussian", description="Object shape: gaussian, airy, etc."
+    )
+    basis: str = Field(
+        "eigen", description="Phase basis: eigen, eigenfull, zernike, or zonal"
+    )
+    Jmax: int = Field(55, description="Maximum number of phase modes")
+
+    # Initial values for continuation from previous run
+    initial_phase: Optional[List[float]] = Field(
+        None, description="Initial phase coefficients (from previous run)"
+    )
+    initial_illum: Optional[List[float]] = Field(
+        None, description="Initial illumination coefficients"
+    )
+    initial_defoc_z: Optional[List[float]] = Field(
+        None, description="Initial defocus values"
+    )
+    initial_optax_x: Optional[List[float]] = Field(
+        None, description="Initial optical axis X shifts"
+    )
+    initial_optax_y: Optional[List[float]] = Field(
+        None, description="Initial optical axis Y shifts"
+    )
+    initial_focscale: Optional[float] = Field(None, description="Initial focal scale")
+    initial_object_fwhm_pix: Optional[float] = Field(
+        None, description="Initial object FWHM"
+    )
+    initial_amplitude: Optional[List[float]] = Field(
+        None, description="Initial amplitude values"
+    )
+    initial_background: Optional[List[float]] = Field(
+        None, description="Initial background values"
+    )
+
+
+class PreviewConfigRequest(BaseModel):
+    images: Optional[List[List[List[float]]]] = Field(
+        None, description="3D image array [N, H, W] (or an 'images' NPY part)"
+    )
+    image_id: Optional[str] = Field(
+        None, description="Id of a stack stored by /api/parse-images"
+    )
+    image_indices: Optional[List[int]] = Field(
+        None, description="Subset of the stack to use (default: all images)"
+    )
+    config: OpticalConfigRequest
+
+
+class SearchPhaseRequest(BaseModel):
+    images: Optional[List[List[List[float]]]] = Field(
+        None, description="3D image array [N, H, W] (or an 'images' NPY part)"
+    )
+    image_id: Optional[str] = Field(
+        None, description="Id of a stack stored by /api/parse-images"
+    )
+    image_indices: Optional[List[int]] = Field(
+        None, description="Subset of the stack to use (default: all images)"
+    )
+    config: OpticalConfigRequest
+    defoc_z_flag: bool = Field(False, description="Fit defocus distances")
+    focscale_flag: bool = Field(False, description="Fit focal scale")
+    optax_flag: bool = Field(False, description="Fit optical axis shifts")
+    amplitude_flag: bool = Field(True, description="Fit image amplitudes")
+    background_flag: bool = Field(False, description="Fit background levels")
+    phase_flag: bool = Field(True, description="Fit phase aberrations")
+    illum_flag: bool = Field(False, description="Fit illumination")
+    objsize_flag: bool = Field(False, description="Fit object size")
+    estimate_snr: bool = Field(False, description="Estimate SNR for optimal weighting")
+    verbose: bool = Field(True, description="Verbose output")
+    tolerance: float = Field(1e-5, description="Convergence tolerance")
+    max_iterations: Optional[int] = Field(
+        None, ge=1, description="Stop after this many optimizer iterations"
+    )
+    max_wall_time: Optional[float] = Field(
+        None, gt=0, description="Stop after this many seconds of search"
+    )
+    progress_coefficients: bool = Field(
+        False, description="Include the coefficient vector in progress events"
+    )
+    fft_backend: Optional[Literal["numpy", "scipy"]] = Field(
+        None, description="FFT backend of the PSF model (default: FFT_BACKEND)"
+    )
+    fft_workers: Optional[int] = Field(
+        None, ge=1, description="FFT threads (scipy backend, default: FFT_WORKERS)"
+    )
+    precision: Literal["float64", "float32"] = Field(
+        "float64",
+        description="Experimental: float32 runs single-precision images and FFTs",
+    )
+    coarse_factor: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Fit images binned by this factor first (coarse-to-fine)",
+    )
+    coarse_jmax: int = Field(15, ge=1, description="Phase modes of the coarse stage")
+    refine_max_iterations: Optional[int] = Field(
+        None, description="Iteration limit of the full-resolution refinement"
+    )
+    result_arrays: Optional[List[ResultArray]] = Field(
+        None, description="Maps and images to return (default: all of them)"
+    )
+    result_dtype: Literal["float64", "float32"] = Field(
+        "float64", description="dtype of the returned maps and images"
+    )
+    mask_outside_pupil: bool = Field(
+        False, description="Set pupil-plane maps to NaN outside the pupil"
+    )
+
+
+class MultistartSearchRequest(SearchPhaseRequest):
+    starts: int = Field(4, ge=1, le=64, description="Number of independent fits")
+    start_amplitude: float = Field(
+        0.5, gt=0, description="Perturbation of the starting phase, in radians"
+    )
+    seed: Optional[int] = Field(None, description="Seed of the random starts")
+
+
+class BatchDataset(BaseModel):
+    name: Optional[str] = Field(None, description="Label echoed in the results")
+    images: Optional[List[List[List[float]]]] = Field(
+        None,
+        description="3D image array [N, H, W] (or a 'datasets.<i>.images' NPY part)",
+    )
+    image_id: Optional[str] = Field(
+        None, description="Id of a stack stored by /api/parse-images"
+    )
+    image_indices: Optional[List[int]] = Field(
+        None, description="Subset of the stack to use (default: all images)"
+    )
+
+
+class BatchSearchRequest(SearchPhaseRequest):
+    datasets: List[BatchDataset] = Field(
+        ..., min_length=1, description="Image stacks fitted with the same config"
+    )
+
+
+class SweepRequest(SearchPhaseRequest):
+    sweep: Dict[str, List[Any]] = Field(
+        ..., description="Values of each swept OpticalConfigRequest field"
+    )
+    mode: Literal["grid", "zip"] = Field(
+        "grid", description="grid: all combinations, zip: values taken in step"
+    )
+    warm_start: bool = Field(
+        True, description="Start each point from its neighbour's solution"
+    )
+
+
+class TimeSeriesRequest(SearchPhaseRequest):
+    images_per_frame: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Images of one frame (default: one per defoc_z value)",
+    )
+    warm_start: bool = Field(
+        True, description="Start each frame from the previous frame's solution"
+    )
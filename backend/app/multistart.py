@@ -0,0 +1,97 @@
+"""
+Multi-start phase searches.
+
+Phase diversity fits can converge to a local minimum depending on the starting
+phase. A multi-start search runs K independent fits from different starting
+points in the job pool (so it takes the wall time of one fit when there are K
+free workers) and keeps the lowest chi2:
+
+- start 0: the request's own starting point (initial_* values or zero),
+- starts 1 and 2: defocus term (phase[2]) set to +amplitude / -amplitude,
+  which separates the two defocus-sign solutions,
+- further starts: random low-order modes with ``amplitude`` radians RMS each.
+
+Tip and tilt (phase[0:2]) are never perturbed: they only shift the images.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Modes perturbed by random starts (low orders after tip/tilt)
+LOW_ORDER_MODES = 10
+DEFOCUS_INDEX = 2
+
+
+@dataclass
+class StartPoint:
+    index: int
+    amplitude: float = 0.5
+    seed: Optional[int] = None
+
+
+def starting_phase(phase: np.ndarray, start: StartPoint) -> np.ndarray:
+    """Starting phase coefficients of ``start`` around ``phase``"""
+    phase = np.array(phase, dtype=np.float64)
+    if start.index == 0 or phase.size <= DEFOCUS_INDEX:
+        return phase
+    if start.index in (1, 2):
+        sign = 1.0 if start.index == 1 else -1.0
+        phase[DEFOCUS_INDEX] = sign * start.amplitude
+        return phase
+
+    seed = None if start.seed is None else (start.seed, start.index)
+    rng = np.random.default_rng(seed)
+    modes = slice(DEFOCUS_INDEX, min(phase.size, DEFOCUS_INDEX + LOW_ORDER_MODES))
+    phase[modes] += rng.normal(0.0, start.amplitude, size=phase[modes].size)
+    return phase
+
+
+def result_chi2(response: Dict[str, Any]) -> float:
+    return float(response["results"]["chi2"])
+
+
+def summarize_starts(starts: List[StartPoint], outcomes: List[Any]) -> Dict[str, Any]:
+    """
+    Pick the best-chi2 fit among ``outcomes`` (run_search responses, or the
+    exception a start failed with) and describe the spread of the solutions.
+    """
+    table = []
+    succeeded = []
+    for start, outcome in zip(starts, outcomes):
+        if isinstance(outcome, BaseException):
+            table.append({"start": start.index, "error": str(outcome)})
+            continue
+        succeeded.append((start, outcome))
+        table.append(
+            {
+                "start": start.index,
+                "chi2": result_chi2(outcome),
+                "weighted_rms_nm": outcome["results"]["rms_stats"]["weighted"],
+                "truncated": outcome["truncated"],
+                "duration_ms": outcome["duration_ms"],
+                "error": None,
+            }
+        )
+
+    if not succeeded:
+        return {"success": False, "best_start": None, "best": None, "starts": table}
+
+    best_start, best = min(succeeded, key=lambda item: result_chi2(item[1]))
+    chi2 = np.array([result_chi2(r) for _, r in succeeded])
+    phases = np.array([np.asarray(r["results"]["phase"]) for _, r in succeeded])
+    wrms = np.array([r["results"]["rms_stats"]["weighted"] for _, r in succeeded])
+    return {
+        "success": True,
+        "best_start": best_start.index,
+        "best": best,
+        "starts": table,
+        "spread": {
+            "chi2_min": float(chi2.min()),
+            "chi2_max": float(chi2.max()),
+            "chi2_std": float(chi2.std()),
+            "weighted_rms_std_nm": float(wrms.std()),
+            "phase_std": phases.std(axis=0),
+        },
+    }
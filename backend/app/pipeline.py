@@ -0,0 +1,542 @@
+"""
+Opticsetup construction, phase search and result assembly.
+
+Everything here is independent of FastAPI so it can run in the API process
+(previews) as well as in the search worker processes (see jobs.py).
+"""
+
+import io
+import os
+import base64
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, get_args
+
+import numpy as np
+from PIL import Image
+
+from app.basis_cache import (
+    GEOMETRY_BASIS,
+    apply_basis_state,
+    basis_cache,
+    basis_state,
+)
+from app.core import diversity as div
+from app.log_capture import core_output
+from app.models import ResultArray, SearchPhaseRequest
+from app.coarse_to_fine import coarse_stage, coarse_summary, refine_request
+from app.fft_backend import use_fft_backend
+from app.multistart import StartPoint, starting_phase
+from app.progress import (
+    FLAG_FIELDS,
+    SearchInterrupted,
+    apply_coefficients,
+    free_parameter_count,
+    monitor_search,
+)
+
+logger = logging.getLogger(__name__)
+
+# Server-wide cap on the search time of every request, in seconds (0: none)
+SERVER_MAX_WALL_TIME = float(os.environ.get("SEARCH_MAX_WALL_TIME", 0)) or None
+# Budget left to a refinement whose coarse stage used up the wall time: it
+# stops at its first model evaluation (0 would mean no limit)
+MIN_WALL_TIME = 1e-3
+
+
+def generate_thumbnail(image_2d: np.ndarray, size: int = 128) -> str:
+    """Generate base64 PNG thumbnail from 2D numpy array
+
+    Core algorithm uses [x, y] convention, but PIL expects [height, width] = [y, x].
+    We transpose to match PIL's expected format and flip vertically to get origin='lower' effect.
+    """
+    if image_2d.size == 0:
+        raise ValueError("Cannot generate thumbnail from empty array")
+
+    img_min, img_max = image_2d.min(), image_2d.max()
+    if img_max > img_min:
+        img_normalized = ((image_2d - img_min) / (img_max - img_min) * 255).astype(
+            np.uint8
+        )
+    else:
+        img_normalized = np.full_like(image_2d, 128, dtype=np.uint8)
+
+    # Transpose from [x, y] to [y, x] and flip vertically to match origin='lower'
+    img_normalized = np.flipud(img_normalized.T)
+
+    img_pil = Image.fromarray(img_normalized)
+    img_pil.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    img_pil.save(buffer, format="PNG")
+    img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+    return f"data:image/png;base64,{img_base64}"
+
+
+def generate_opticsetup_thumbnails(opticsetup):
+    """Generate both pupil and illumination thumbnails from an Opticsetup instance"""
+    pupil_image = generate_thumbnail(opticsetup.pupilmap, size=256)
+    illumination_map = opticsetup.mappy(opticsetup.pupillum)
+    illumination_image = generate_thumbnail(illumination_map, size=256)
+    return pupil_image, illumination_image
+
+
+def calculate_config_info(opticsetup, config):
+    """Calculate configuration information from an Opticsetup instance"""
+    sampling_factor = config.wvl * config.fratio / config.pixelSize
+    nphi = opticsetup.idx[0].size
+
+    if opticsetup.basis_type in ["eigen", "zernike"]:
+        phase_modes = opticsetup.phase_basis.shape[1]
+    elif opticsetup.basis_type == "eigenfull":
+        phase_modes = opticsetup.phase_basis.shape[1]
+    else:  # zonal
+        phase_modes = nphi
+
+    return {
+        "pdiam": float(opticsetup.pdiam),
+        "nphi": int(nphi),
+        "sampling_factor": float(sampling_factor),
+        "computation_format": f"{opticsetup.N}x{opticsetup.N}",
+        "data_format": f"{opticsetup.Ncrop}x{opticsetup.Ncrop}",
+        "basis_type": opticsetup.basis_type,
+        "phase_modes": int(phase_modes),
+    }
+
+
+def create_opticsetup_with_mocked_io(img_array: np.ndarray, config, logger):
+    """Create Opticsetup with stdin mocked and stdout redirected to logger"""
+    with core_output(logger):
+        opticsetup = div.Opticsetup(
+            img_collection=img_array,
+            xc=config.xc,
+            yc=config.yc,
+            N=config.N,
+            defoc_z=config.defoc_z,
+            pupilType=config.pupilType,
+            flattening=config.flattening,
+            obscuration=config.obscuration,
+            angle=config.angle,
+            nedges=config.nedges,
+            spiderAngle=config.spiderAngle,
+            spiderArms=config.spiderArms,
+            spiderOffset=config.spiderOffset,
+            illum=config.illum,
+            wvl=config.wvl,
+            fratio=config.fratio,
+            pixelSize=config.pixelSize,
+            edgeblur_percent=config.edgeblur_percent,
+            object_fwhm_pix=config.object_fwhm_pix,
+            object_shape=config.object_shape,
+            basis=config.basis,
+            Jmax=config.Jmax,
+        )
+        return opticsetup
+
+
+def with_cached_basis(img_array: np.ndarray, config, logger):
+    """Setup given the cached basis of ``config``, or None if none is cached"""
+    if not basis_cache.knows(config):
+        return None
+    opticsetup = create_opticsetup_with_mocked_io(
+        img_array, config.model_copy(update={"basis": GEOMETRY_BASIS}), logger
+    )
+    state = basis_cache.load(basis_cache.key(opticsetup, config))
+    if state is None:
+        return None
+    apply_basis_state(opticsetup, state)
+    logger.info(f"♻️  Using cached {config.basis} basis")
+    return opticsetup
+
+
+def get_or_create_opticsetup(img_array: np.ndarray, config, logger):
+    """
+    Create an Opticsetup, going through the on-disk cache for costly bases.
+
+    When a basis of this config is cached, the geometry is built with the
+    cheap zernike basis and given the cached basis of that pupil. Otherwise
+    the full setup is built and its basis stored, under the config's build
+    lock so concurrent workers compute it once. Every call returns a fresh
+    instance that the caller may mutate.
+    """
+    if not basis_cache.applies_to(config):
+        return create_opticsetup_with_mocked_io(img_array, config, logger)
+
+    opticsetup = with_cached_basis(img_array, config, logger)
+    if opticsetup is not None:
+        return opticsetup
+    with basis_cache.build_lock(config):
+        # Another worker may have stored it while this one waited
+        opticsetup = with_cached_basis(img_array, config, logger)
+        if opticsetup is None:
+            opticsetup = create_opticsetup_with_mocked_io(img_array, config, logger)
+            basis_cache.save(
+                basis_cache.key(opticsetup, config), basis_state(opticsetup)
+            )
+    return opticsetup
+
+
+def encode_state(opticsetup) -> np.ndarray:
+    """Packed coefficient vector of the current Opticsetup state"""
+    return opticsetup.encode_coefficients(
+        opticsetup.defoc_z,
+        opticsetup.focscale,
+        opticsetup.optax_x,
+        opticsetup.optax_y,
+        opticsetup.amplitude,
+        opticsetup.background,
+        opticsetup.phase,
+        opticsetup.illum,
+        opticsetup.object_fwhm_pix,
+    )
+
+
+def _rms(phi: np.ndarray, weights: np.ndarray, weights_sum: float):
+    """Raw and illumination-weighted RMS of a pupil phase"""
+    return float(np.std(phi)), float(np.sqrt(np.vdot(phi * phi, weights) / weights_sum))
+
+
+def assemble_results(opticsetup, psfs=None) -> Dict[str, Any]:
+    """
+    Derive all maps and statistics of a fitted Opticsetup.
+
+    The pupil phase is generated once per distinct map (full, without
+    tip/tilt, without tip/tilt/defocus) and every map and RMS value is derived
+    from those three vectors. ``psfs`` are the model images at the current
+    coefficients if already known; otherwise they are computed.
+    """
+    # Phase statistics calculations (matching diversity.py lines 1164-1184)
+    phi_pupil = opticsetup.phase_generator(opticsetup.phase)
+    phi_pupil_notilt = opticsetup.phase_generator(opticsetup.phase, tiptilt=False)
+    phi_pupil_notiltdef = opticsetup.phase_generator(
+        opticsetup.phase, tiptilt=False, defoc=False
+    )
+    rad2nm = opticsetup.wvl / (2 * np.pi) * 1e9
+    phi_pupil_nm = phi_pupil * rad2nm
+    phi_pupil_nm_notilt = phi_pupil_notilt * rad2nm
+    phi_pupil_nm_notiltdef = phi_pupil_notiltdef * rad2nm
+
+    # RMS statistics
+    weights = np.asarray(opticsetup.pupillum)
+    weights_sum = float(np.sum(weights))
+    rms_value, wrms_value = _rms(phi_pupil_nm, weights, weights_sum)
+    rms_value_notilt, wrms_value_notilt = _rms(
+        phi_pupil_nm_notilt, weights, weights_sum
+    )
+    rms_value_notiltdef, wrms_value_notiltdef = _rms(
+        phi_pupil_nm_notiltdef, weights, weights_sum
+    )
+
+    # Phase maps (matching diversity.py lines 1212, 1221)
+    phase_map = opticsetup.mappy(phi_pupil)
+    phase_map_notilt = opticsetup.mappy(phi_pupil_nm_notilt)
+    phase_map_notiltdef = opticsetup.mappy(phi_pupil_nm_notiltdef)
+
+    # Pupil illumination (matching diversity.py line 1230)
+    pupillum_map = opticsetup.mappy(opticsetup.pupillum)
+
+    # Tip/Tilt/Defocus statistics (matching diversity.py lines 1186-1203)
+    ttf = opticsetup.convert * opticsetup.phase[0:3]
+    a2_nmrms = float(ttf[0] * rad2nm)
+    a2_lD = float(ttf[0] * 4 / (2 * np.pi))
+    a2_pix = float(ttf[0] * opticsetup.rad2pix)
+    a2_m = float(ttf[0] * opticsetup.rad2dist)
+    a3_nmrms = float(ttf[1] * rad2nm)
+    a3_lD = float(ttf[1] * 4 / (2 * np.pi))
+    a3_pix = float(ttf[1] * opticsetup.rad2pix)
+    a3_m = float(ttf[1] * opticsetup.rad2dist)
+    a4_nmrms = float(ttf[2] * rad2nm)
+    a4_pix = float(ttf[2] * opticsetup.rad2z / opticsetup.fratio / opticsetup.pixelSize)
+    a4_m = float(ttf[2] * opticsetup.rad2z)
+
+    # Compute model images and differences (matching visualize_images lines 1310-1316)
+    if psfs is None:
+        psfs = div.compute_psfs(opticsetup, encode_state(opticsetup))
+    model_images = np.reshape(psfs, opticsetup.img.shape)
+    image_differences = opticsetup.img - model_images
+
+    # Optical axis position in pixels (matching visualize_images lines 1318-1320)
+    cc = opticsetup.img.shape[1] / 2
+    k = 4 * opticsetup.fratio * (1 * opticsetup.wvl / 2 / np.pi) / opticsetup.pixelSize
+    optax_x_pix = (cc - k * np.asarray(opticsetup.optax_x, dtype=float)).tolist()
+    optax_y_pix = (cc - k * np.asarray(opticsetup.optax_y, dtype=float)).tolist()
+
+    return {
+        "phase": opticsetup.phase,
+        "phase_map": phase_map,
+        "phase_map_notilt": phase_map_notilt,
+        "phase_map_notiltdef": phase_map_notiltdef,
+        "pupilmap": opticsetup.pupilmap,
+        "pupillum": pupillum_map,
+        "defoc_z": opticsetup.defoc_z,
+        "focscale": float(opticsetup.focscale),
+        "optax_x": opticsetup.optax_x,
+        "optax_y": opticsetup.optax_y,
+        "optax_pixels": {"x": optax_x_pix, "y": optax_y_pix},
+        "amplitude": opticsetup.amplitude,
+        "background": opticsetup.background,
+        "illum": opticsetup.illum,
+        "object_fwhm_pix": float(opticsetup.object_fwhm_pix),
+        "origin_images": opticsetup.img,
+        "model_images": model_images,
+        "image_differences": image_differences,
+        "chi2": float(np.vdot(image_differences, image_differences)),
+        "rms_stats": {
+            "raw": rms_value,
+            "weighted": wrms_value,
+            "raw_notilt": rms_value_notilt,
+            "weighted_notilt": wrms_value_notilt,
+            "raw_notiltdef": rms_value_notiltdef,
+            "weighted_notiltdef": wrms_value_notiltdef,
+        },
+        "tiptilt_defocus_stats": {
+            "tip": {
+                "nm_rms": a2_nmrms,
+                "lambda_D": a2_lD,
+                "pixels": a2_pix,
+                "mm": a2_m * 1e3,
+            },
+            "tilt": {
+                "nm_rms": a3_nmrms,
+                "lambda_D": a3_lD,
+                "pixels": a3_pix,
+                "mm": a3_m * 1e3,
+            },
+            "defocus": {"nm_rms": a4_nmrms, "pixels": a4_pix, "mm": a4_m * 1e3},
+        },
+    }
+
+
+# Maps on the pupil grid, NaN-masked outside the pupil on request
+PUPIL_MAPS = ("phase_map", "phase_map_notilt", "phase_map_notiltdef", "pupillum")
+
+
+def compact_results(
+    results: Dict[str, Any], request: SearchPhaseRequest
+) -> Dict[str, Any]:
+    """
+    Keep the maps and images listed in request.result_arrays, cast to
+    request.result_dtype, with pupil-plane maps optionally NaN outside the
+    pupil.
+
+    Runs in the worker, so dropped arrays never cross the process boundary
+    nor get serialized. Coefficients and statistics are always kept.
+    """
+    names = get_args(ResultArray)
+    keep = set(names if request.result_arrays is None else request.result_arrays)
+    outside = None
+    if request.mask_outside_pupil:
+        outside = np.asarray(results["pupilmap"]) == 0
+        if np.shape(results["phase_map"]) != outside.shape:
+            outside = None  # maps not on the pupilmap grid
+    compact = {}
+    for name, value in results.items():
+        if name not in names:
+            compact[name] = value
+        elif name in keep:
+            value = np.asarray(value, dtype=request.result_dtype)
+            if name in PUPIL_MAPS and outside is not None:
+                value = np.where(outside, np.nan, value).astype(value.dtype)
+            compact[name] = value
+    return compact
+
+
+def effective_wall_time(request: SearchPhaseRequest) -> Optional[float]:
+    limits = [t for t in (request.max_wall_time, SERVER_MAX_WALL_TIME) if t]
+    return min(limits) if limits else None
+
+
+def run_search(
+    img_array: np.ndarray,
+    request: SearchPhaseRequest,
+    should_stop: Optional[Callable[[], bool]] = None,
+    start: Optional[StartPoint] = None,
+    build: Optional[Callable[..., Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Build the Opticsetup, run search_phase and assemble all results.
+
+    Pure compute function with no FastAPI dependency, so it can run in a
+    worker process. Arrays are returned as numpy arrays; callers serialize.
+
+    The search stops early on request.max_iterations, request.max_wall_time
+    or when ``should_stop()`` returns True; results then hold the best
+    coefficients found so far and ``truncated`` is set. ``start`` selects a
+    multi-start starting point (see app.multistart).
+
+    With request.coarse_factor, a search on binned images with
+    request.coarse_jmax modes runs first and seeds the full-resolution search
+    (see app.coarse_to_fine). ``build(img_array, config, logger)`` replaces
+    get_or_create_opticsetup to supply the Opticsetup (see app.sweep).
+    """
+    start_time = time.time()
+    logger.info(f"🔬 Starting phase diversity search...")
+
+    coarse_info = None
+    stage = coarse_stage(img_array, request) if request.coarse_factor else None
+    if stage is not None:
+        coarse_images, coarse_request, factor = stage
+        coarse_jmax = coarse_request.config.Jmax
+        logger.info(
+            f"🔭 Coarse stage: images binned {factor}x{factor}, Jmax={coarse_jmax}"
+        )
+        coarse = run_search(coarse_images, coarse_request, should_stop, start)
+        coarse_info = coarse_summary(coarse, factor, coarse_jmax)
+        budget = effective_wall_time(request)
+        request = refine_request(request, coarse, factor)
+        if budget is not None:
+            # Both stages share the wall-time budget of the request
+            remaining = budget - (time.time() - start_time)
+            request = request.model_copy(
+                update={"max_wall_time": max(remaining, MIN_WALL_TIME)}
+            )
+        start = None  # Already applied to the coarse stage
+        logger.info("🔬 Refining at full resolution...")
+
+    logger.info(f"📊 Image array shape: {img_array.shape}, dtype: {img_array.dtype}")
+
+    # Create Opticsetup instance
+    logger.info(f"⚙️  Creating Opticsetup instance...")
+    config = request.config
+    if request.precision == "float32":
+        # Experimental, no speedup measured yet; see app.precision
+        logger.warning("⚠️  precision=float32 is experimental")
+        img_array = np.asarray(img_array, dtype=np.float32)
+    opticsetup = (build or get_or_create_opticsetup)(img_array, config, logger)
+    logger.info("✅ Opticsetup created successfully")
+
+    # Inject initial values if provided (for continuation from previous run)
+    if config.initial_phase is not None:
+        # Missing modes (e.g. from a fit with a lower Jmax) start at zero
+        phase = np.zeros(np.size(opticsetup.phase))
+        n = min(phase.size, len(config.initial_phase))
+        phase[:n] = config.initial_phase[:n]
+        opticsetup.phase = phase
+        logger.info(
+            f"   ↻ Continuing with initial phase ({len(config.initial_phase)} coefficients)"
+        )
+
+    if config.initial_illum is not None:
+        opticsetup.illum = config.initial_illum
+        logger.info(f"   ↻ Continuing with initial illumination")
+
+    if config.initial_defoc_z is not None:
+        opticsetup.defoc_z = np.array(config.initial_defoc_z)
+        logger.info(f"   ↻ Continuing with initial defoc_z")
+
+    if config.initial_optax_x is not None:
+        opticsetup.optax_x = np.array(config.initial_optax_x)
+        logger.info(f"   ↻ Continuing with initial optax_x")
+
+    if config.initial_optax_y is not None:
+        opticsetup.optax_y = np.array(config.initial_optax_y)
+        logger.info(f"   ↻ Continuing with initial optax_y")
+
+    if config.initial_focscale is not None:
+        opticsetup.focscale = config.initial_focscale
+        logger.info(f"   ↻ Continuing with initial focscale={config.initial_focscale}")
+
+    if config.initial_object_fwhm_pix is not None:
+        opticsetup.object_fwhm_pix = config.initial_object_fwhm_pix
+        logger.info(
+            f"   ↻ Continuing with initial object_fwhm_pix={config.initial_object_fwhm_pix}"
+        )
+
+    if config.initial_amplitude is not None:
+        opticsetup.amplitude = np.array(config.initial_amplitude)
+        logger.info(f"   ↻ Continuing with initial amplitude")
+
+    if config.initial_background is not None:
+        opticsetup.background = np.array(config.initial_background)
+        logger.info(f"   ↻ Continuing with initial background")
+
+    if start is not None and start.index:
+        opticsetup.phase = starting_phase(opticsetup.phase, start)
+        logger.info(f"   🎲 Multi-start {start.index}: perturbed starting phase")
+
+    # Generate thumbnails
+    pupil_image, illumination_image = generate_opticsetup_thumbnails(opticsetup)
+
+    # Calculate configuration info
+    config_info = calculate_config_info(opticsetup, config)
+
+    logger.info(
+        f"   pdiam={config_info['pdiam']:.1f}, nphi={config_info['nphi']}, sampling={config_info['sampling_factor']:.2f}"
+    )
+
+    # Run phase search with stdout redirected to capture print() statements
+    logger.info(f"🔍 Starting phase search...")
+    truncation_reason = None
+    with use_fft_backend(
+        request.fft_backend, request.fft_workers, request.precision
+    ) as backend, core_output(logger), monitor_search(
+        opticsetup,
+        include_coefficients=request.progress_coefficients,
+        max_iterations=request.max_iterations,
+        max_wall_time=effective_wall_time(request),
+        should_stop=should_stop,
+        free_parameters=free_parameter_count(
+            opticsetup, **{flag: getattr(request, flag) for flag in FLAG_FIELDS}
+        ),
+    ) as monitor:
+        logger.info(
+            f"   FFT backend: {backend.name} ({backend.workers} threads, {request.precision})"
+        )
+        try:
+            opticsetup.search_phase(
+                defoc_z_flag=request.defoc_z_flag,
+                focscale_flag=request.focscale_flag,
+                optax_flag=request.optax_flag,
+                amplitude_flag=request.amplitude_flag,
+                background_flag=request.background_flag,
+                phase_flag=request.phase_flag,
+                illum_flag=request.illum_flag,
+                objsize_flag=request.objsize_flag,
+                estimate_snr=request.estimate_snr,
+                verbose=True,
+                tolerance=request.tolerance,
+            )
+        except SearchInterrupted as e:
+            truncation_reason = e.reason
+
+    if truncation_reason is None:
+        monitor.finish(encode_state(opticsetup))
+    search_stats = monitor.stats()
+    logger.info(
+        f"   {search_stats['model_evaluations']} model evaluations over "
+        f"{search_stats['iterations']} iterations"
+    )
+    if truncation_reason is None:
+        logger.info(f"✅ Phase search completed")
+    else:
+        logger.warning(f"⏹️  Phase search stopped early: {truncation_reason}")
+        if monitor.base_coeffs is not None and not apply_coefficients(
+            opticsetup, monitor.base_coeffs
+        ):
+            logger.warning(
+                "   Could not restore the last accepted coefficients, "
+                "keeping the core's state"
+            )
+
+    # Reuse the model images of the final point when the search evaluated it
+    psfs = monitor.psfs_for(encode_state(opticsetup))
+    with use_fft_backend(request.fft_backend, request.fft_workers, request.precision):
+        results = compact_results(assemble_results(opticsetup, psfs), request)
+
+    duration_ms = int((time.time() - start_time) * 1000)
+    logger.info(f"✅ Search complete in {duration_ms}ms")
+
+    response = {
+        "success": True,
+        "config_info": config_info,
+        "pupil_image": pupil_image,
+        "illumination_image": illumination_image,
+        "results": results,
+        "duration_ms": duration_ms,
+        "truncated": truncation_reason is not None,
+        "truncation_reason": truncation_reason,
+        "search_stats": search_stats,
+        "coarse_stage": coarse_info,
+    }
+    return response
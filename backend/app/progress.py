@@ -0,0 +1,355 @@
+"""
+Structured progress events for phase searches.
+
+The Levenberg-Marquardt loop lives in the core and only reports progress
+through print(). It does evaluate the model through the module-level
+``diversity.compute_psfs``, so a wrapper installed there (once per process,
+dispatching through a context variable like log_capture) observes every
+evaluation of the search running in the current context.
+
+Evaluations that differ from the current point in at most one coefficient are
+finite-difference probes; the others are trial steps. Whether the core
+accepted a trial is read from what it evaluates next, not from a chi2
+computed here (the core may weight its own, e.g. with estimate_snr): probes
+around the trial mean the core moved there and computes its Jacobian, while
+probes around the old point or another trial step mean it was rejected. Each
+trial yields one event once resolved: iteration (accepted steps so far), chi2
+(unweighted sum of squared residuals, for display), step norm, elapsed time
+and optionally the coefficient vector.
+
+With a single free coefficient every evaluation differs from the current
+point in one coefficient, so probes and trial steps look alike. The monitor
+is told the number of free coefficients (free_parameter_count) and, in that
+case, accepts an evaluation when it lowers its own chi2: iteration counts and
+max_iterations are then approximate.
+
+The same hook enforces search limits: once the iteration budget or wall time
+is exhausted, or the job is cancelled, the next evaluation raises
+SearchInterrupted and the caller restores the last point the core accepted
+(see apply_coefficients).
+
+Events travel as log records on the ``app.progress`` logger with a
+``progress`` attribute, so they follow the job log pipeline (worker queue,
+per-job tagging) and are streamed on ``/ws/jobs/{job_id}/progress``.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core import diversity as div
+from app.log_capture import current_job_id
+
+progress_logger = logging.getLogger("app.progress")
+
+DEFAULT_MAX_JOBS = 100
+# Minimum delay between two checks of the (cross-process) cancel flag
+CANCEL_CHECK_INTERVAL_S = 0.25
+
+# Argument order of Opticsetup.encode_coefficients
+COEFFICIENT_FIELDS = (
+    "defoc_z",
+    "focscale",
+    "optax_x",
+    "optax_y",
+    "amplitude",
+    "background",
+    "phase",
+    "illum",
+    "object_fwhm_pix",
+)
+
+# Search flags and the coefficient fields they free
+FLAG_FIELDS = {
+    "defoc_z_flag": ("defoc_z",),
+    "focscale_flag": ("focscale",),
+    "optax_flag": ("optax_x", "optax_y"),
+    "amplitude_flag": ("amplitude",),
+    "background_flag": ("background",),
+    "phase_flag": ("phase",),
+    "illum_flag": ("illum",),
+    "objsize_flag": ("object_fwhm_pix",),
+}
+
+_monitor: ContextVar[Optional["SearchMonitor"]] = ContextVar(
+    "search_monitor", default=None
+)
+_install_lock = threading.Lock()
+
+
+class SearchInterrupted(Exception):
+    """Raised from the model evaluation to stop a search early"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Search interrupted: {reason}")
+        self.reason = reason
+
+
+class SearchMonitor:
+    """Follows the model evaluations of one search and emits progress events"""
+
+    def __init__(
+        self,
+        opticsetup,
+        include_coefficients: bool = False,
+        max_iterations: Optional[int] = None,
+        max_wall_time: Optional[float] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        free_parameters: Optional[int] = None,
+    ):
+        self.opticsetup = opticsetup
+        self.free_parameters = free_parameters
+        self.include_coefficients = include_coefficients
+        self.max_iterations = max_iterations
+        self.max_wall_time = max_wall_time
+        self.should_stop = should_stop
+        self.start_time = time.perf_counter()
+        self._last_stop_check = self.start_time
+        self.evaluations = 0
+        self.trials = 0
+        self.iteration = 0
+        # Last point accepted by the core, and the trial not yet resolved
+        self.base_coeffs: Optional[np.ndarray] = None
+        self.base_chi2 = np.inf
+        self._pending: Optional[Tuple[np.ndarray, float, np.ndarray]] = None
+        # Model images at the accepted and pending points, reused after the fit
+        self._psfs: Dict[bytes, np.ndarray] = {}
+        # Residual buffer reused by every evaluation of the search
+        self._residuals: Optional[np.ndarray] = None
+
+    def check_limits(self):
+        now = time.perf_counter()
+        if (
+            self.max_wall_time is not None
+            and now - self.start_time > self.max_wall_time
+        ):
+            raise SearchInterrupted(f"max_wall_time of {self.max_wall_time}s reached")
+        if self.max_iterations is not None and self.iteration >= self.max_iterations:
+            raise SearchInterrupted(f"max_iterations of {self.max_iterations} reached")
+        if (
+            self.should_stop is not None
+            and now - self._last_stop_check > CANCEL_CHECK_INTERVAL_S
+        ):
+            self._last_stop_check = now
+            if self.should_stop():
+                raise SearchInterrupted("cancelled")
+
+    def observe(self, coeffs, psfs):
+        self.check_limits()
+        self.evaluations += 1
+        coeffs = np.array(coeffs, dtype=np.float64)
+
+        if self.free_parameters is not None and self.free_parameters <= 1:
+            self._observe_by_chi2(coeffs, psfs)
+            return
+        if self.base_coeffs is not None:
+            if self._pending is not None and _is_probe(coeffs, self._pending[0]):
+                # The core computes its Jacobian at the trial point: accepted
+                self._resolve(accepted=True)
+                return
+            if self._pending is not None:
+                # Back at the old point, or another step tried: rejected
+                self._resolve(accepted=False)
+            if _is_probe(coeffs, self.base_coeffs):
+                # Finite-difference probe around the current point
+                return
+
+        chi2 = self._chi2(psfs)
+        if self.base_coeffs is None:
+            self.base_coeffs = coeffs
+            self.base_chi2 = chi2
+            self._psfs = {coeffs.tobytes(): psfs}
+            self.emit(chi2, 0.0, True, coeffs)
+            return
+        self.trials += 1
+        self._pending = (coeffs, chi2, psfs)
+        self._psfs[coeffs.tobytes()] = psfs
+
+    def _observe_by_chi2(self, coeffs, psfs):
+        """Single free coefficient: accept evaluations that lower the chi2"""
+        chi2 = self._chi2(psfs)
+        if self.base_coeffs is None:
+            self.base_coeffs = coeffs
+            self.base_chi2 = chi2
+            self._psfs = {coeffs.tobytes(): psfs}
+            self.emit(chi2, 0.0, True, coeffs)
+            return
+        self.trials += 1
+        step_norm = float(np.linalg.norm(coeffs - self.base_coeffs))
+        accepted = chi2 < self.base_chi2
+        if accepted:
+            self.iteration += 1
+            self.base_coeffs = coeffs
+            self.base_chi2 = chi2
+            self._psfs = {coeffs.tobytes(): psfs}
+        self.emit(chi2, step_norm, accepted, coeffs)
+
+    def finish(self, coeffs):
+        """Resolve the last trial against the core's final coefficients"""
+        if self._pending is not None:
+            final = np.asarray(coeffs, dtype=np.float64)
+            self._resolve(accepted=np.array_equal(final, self._pending[0]))
+
+    def _resolve(self, accepted: bool):
+        coeffs, chi2, psfs = self._pending
+        self._pending = None
+        step_norm = float(np.linalg.norm(coeffs - self.base_coeffs))
+        if accepted:
+            self.iteration += 1
+            self.base_coeffs = coeffs
+            self.base_chi2 = chi2
+        self._psfs = {
+            self.base_coeffs.tobytes(): self._psfs[self.base_coeffs.tobytes()]
+        }
+        self.emit(chi2, step_norm, accepted, coeffs)
+
+    def _chi2(self, psfs) -> float:
+        img = self.opticsetup.img
+        if self._residuals is None:
+            self._residuals = np.empty(img.shape, dtype=np.result_type(img, psfs))
+        residuals = self._residuals
+        np.subtract(img, np.reshape(psfs, img.shape), out=residuals)
+        return float(np.vdot(residuals, residuals).real)
+
+    def stats(self) -> Dict[str, Any]:
+        """Iterations, trial steps and model evaluations of the search"""
+        return {
+            "iterations": self.iteration,
+            "trials": self.trials,
+            "model_evaluations": self.evaluations,
+            "elapsed_ms": int((time.perf_counter() - self.start_time) * 1000),
+        }
+
+    def psfs_for(self, coeffs) -> Optional[np.ndarray]:
+        """Model images already computed at ``coeffs`` (accepted point)"""
+        return self._psfs.get(np.asarray(coeffs, dtype=np.float64).tobytes())
+
+    def emit(self, chi2, step_norm, accepted, coeffs):
+        event = {
+            "type": "progress",
+            "iteration": self.iteration,
+            "trial": self.trials,
+            "accepted": accepted,
+            "chi2": chi2,
+            "best_chi2": self.base_chi2,
+            "step_norm": step_norm,
+            "evaluations": self.evaluations,
+            "elapsed_ms": int((time.perf_counter() - self.start_time) * 1000),
+        }
+        if self.include_coefficients:
+            event["coefficients"] = coeffs.tolist()
+        progress_logger.info(
+            f"📈 Iteration {self.iteration} (trial {self.trials}): chi2={chi2:.6g}",
+            extra={"progress": event},
+        )
+
+
+def _is_probe(coeffs: np.ndarray, point: np.ndarray) -> bool:
+    """True if ``coeffs`` differs from ``point`` in at most one coefficient"""
+    return np.count_nonzero(coeffs - point) <= 1
+
+
+def free_parameter_count(opticsetup, **flags: bool) -> int:
+    """Number of coefficients a search with these *_flag arguments may change"""
+    return sum(
+        np.size(getattr(opticsetup, name))
+        for flag, names in FLAG_FIELDS.items()
+        if flags.get(flag)
+        for name in names
+    )
+
+
+def _monitored(compute_psfs):
+    def compute_psfs_monitored(opticsetup, coeffs, *args, **kwargs):
+        psfs = compute_psfs(opticsetup, coeffs, *args, **kwargs)
+        monitor = _monitor.get()
+        if monitor is not None and monitor.opticsetup is opticsetup:
+            monitor.observe(coeffs, psfs)
+        return psfs
+
+    compute_psfs_monitored.__wrapped__ = compute_psfs
+    return compute_psfs_monitored
+
+
+def install():
+    """Wrap diversity.compute_psfs for this process (idempotent)"""
+    with _install_lock:
+        if not hasattr(div.compute_psfs, "__wrapped__"):
+            div.compute_psfs = _monitored(div.compute_psfs)
+
+
+@contextmanager
+def monitor_search(opticsetup, **limits):
+    """
+    Emit progress events for the search run on ``opticsetup`` in this context.
+
+    Keyword arguments are passed to SearchMonitor (include_coefficients,
+    max_iterations, max_wall_time, should_stop, free_parameters).
+    """
+    install()
+    monitor = SearchMonitor(opticsetup, **limits)
+    token = _monitor.set(monitor)
+    try:
+        yield monitor
+    finally:
+        _monitor.reset(token)
+
+
+def apply_coefficients(opticsetup, coeffs) -> bool:
+    """
+    Write a packed coefficient vector back into the Opticsetup attributes.
+
+    Only done when encode_coefficients is verified to be a plain concatenation
+    of the attributes for the current state; returns False otherwise.
+    """
+    current = [getattr(opticsetup, name) for name in COEFFICIENT_FIELDS]
+    flat = [np.atleast_1d(np.asarray(v, dtype=np.float64)).ravel() for v in current]
+    packed = np.asarray(opticsetup.encode_coefficients(*current), dtype=np.float64)
+    coeffs = np.asarray(coeffs, dtype=np.float64)
+    if packed.shape != coeffs.shape or not np.allclose(packed, np.concatenate(flat)):
+        return False
+
+    offset = 0
+    for name, value, part in zip(COEFFICIENT_FIELDS, current, flat):
+        chunk = coeffs[offset : offset + part.size]
+        offset += part.size
+        if np.isscalar(value) or np.ndim(value) == 0:
+            setattr(opticsetup, name, float(chunk[0]))
+        elif isinstance(value, list):
+            setattr(opticsetup, name, chunk.tolist())
+        else:
+            setattr(opticsetup, name, chunk.reshape(np.shape(value)))
+    return True
+
+
+class ProgressTracker(logging.Handler):
+    """Remember the latest progress event of each job"""
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_JOBS):
+        super().__init__()
+        self.max_jobs = max_jobs
+        self._latest: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def emit(self, record):
+        event = getattr(record, "progress", None)
+        job_id = getattr(record, "job_id", None) or current_job_id()
+        if event is None or job_id is None:
+            return
+        with self.lock:
+            self._latest[job_id] = event
+            self._latest.move_to_end(job_id)
+            while len(self._latest) > self.max_jobs:
+                self._latest.popitem(last=False)
+
+    def latest(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self._latest.get(job_id)
+
+
+progress_tracker = ProgressTracker()
@@ -0,0 +1,90 @@
+"""
+LRU cache of built Opticsetup instances for /api/preview-config.
+
+Building an Opticsetup (pupil map, spiders, edge blur, phase basis) dominates
+preview latency. This cache memoizes whole setups: a preview is served from it
+when the images and every config field a preview reads are unchanged, e.g.
+when only defocus distances or object parameters were edited.
+
+It does not reuse the pupil or basis across wavelength, f-ratio, pixel size or
+illumination edits. The first three set the pupil diameter in computation
+pixels, hence the pupil map and the basis, and the core constructor builds the
+pupil, its illumination and the basis in one go with no entry point to swap
+the illumination alone. Such edits rebuild the setup; costly eigen/eigenfull
+bases of a known geometry still come from app.basis_cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.image_store import ImageStore
+from app.models import OpticalConfigRequest
+from app.pipeline import get_or_create_opticsetup
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 8
+
+# Config fields a preview never depends on
+PREVIEW_INDEPENDENT_FIELDS = {"defoc_z", "object_fwhm_pix", "object_shape"} | {
+    name for name in OpticalConfigRequest.model_fields if name.startswith("initial_")
+}
+
+
+class OpticsetupCache:
+    """Bounded LRU of Opticsetup instances keyed by images + geometry config"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(img_array: np.ndarray, config: OpticalConfigRequest) -> str:
+        geometry = config.model_dump(exclude=PREVIEW_INDEPENDENT_FIELDS)
+        digest = hashlib.sha256(ImageStore.content_id(img_array).encode("ascii"))
+        digest.update(json.dumps(geometry, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            opticsetup = self._entries.get(key)
+            if opticsetup is not None:
+                self._entries.move_to_end(key)
+            return opticsetup
+
+    def put(self, key: str, opticsetup):
+        with self._lock:
+            self._entries[key] = opticsetup
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, img_array: np.ndarray, config: OpticalConfigRequest):
+        """
+        Return an Opticsetup for previews, building it only on a cache miss.
+
+        The returned instance is shared: callers must treat it as read-only.
+        """
+        key = self.key(img_array, config)
+        opticsetup = self.get(key)
+        if opticsetup is not None:
+            logger.info("♻️  Reusing cached Opticsetup geometry")
+            return opticsetup
+
+        opticsetup = get_or_create_opticsetup(img_array, config, logger)
+        if self.max_entries > 0:
+            self.put(key, opticsetup)
+        return opticsetup
+
+
+preview_setup_cache = OpticsetupCache(
+    max_entries=int(os.environ.get("PREVIEW_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+)
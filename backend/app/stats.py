@@ -0,0 +1,117 @@
+"""
+Single-pass image statistics.
+
+Min, max, mean and standard deviation are accumulated chunk by chunk (Chan's
+parallel variance update), so they can be fused with the copy of each chunk
+into the image stack while it is still in cache, instead of four full passes
+over a float64 copy of the collection. Per-image accumulators merge into the
+global one. The display histogram needs the global range, so it is filled by
+``histogram()`` in one extra chunked pass.
+
+NaN and infinite pixels (dead or saturated pixels, masked regions) are left
+out of the statistics and the histogram and counted separately.
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Elements per chunk (512 KiB of float64): stays within L2 cache
+CHUNK_ELEMENTS = 64 * 1024
+HISTOGRAM_BINS = 256
+
+
+class RunningStats:
+    """Count, min, max, mean and sum of squared deviations of a stream"""
+
+    def __init__(self):
+        self.count = 0
+        self.nonfinite = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, chunk: np.ndarray):
+        if chunk.size == 0:
+            return
+        chunk_min, chunk_max = float(chunk.min()), float(chunk.max())
+        if not (np.isfinite(chunk_min) and np.isfinite(chunk_max)):
+            # NaN propagates through min/max: only then look for bad pixels
+            finite = chunk[np.isfinite(chunk)]
+            self.nonfinite += chunk.size - finite.size
+            if finite.size == 0:
+                return
+            chunk = finite
+            chunk_min, chunk_max = float(chunk.min()), float(chunk.max())
+        chunk_mean = float(np.mean(chunk, dtype=np.float64))
+        deviations = chunk - chunk_mean
+        chunk_m2 = float(np.vdot(deviations, deviations))
+        self._combine(chunk.size, chunk_min, chunk_max, chunk_mean, chunk_m2)
+
+    def merge(self, other: "RunningStats"):
+        self.nonfinite += other.nonfinite
+        if other.count:
+            self._combine(other.count, other.min, other.max, other.mean, other.m2)
+
+    def _combine(self, n, min_, max_, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, min_)
+        self.max = max(self.max, max_)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-safe summary; min and max are None without finite pixels"""
+        return {
+            "min": float(self.min) if self.count else None,
+            "max": float(self.max) if self.count else None,
+            "mean": float(self.mean),
+            "std": self.std,
+            "nonfinite": self.nonfinite,
+        }
+
+
+def row_chunks(n_rows: int, row_size: int):
+    """Row slices of about CHUNK_ELEMENTS elements"""
+    step = max(1, CHUNK_ELEMENTS // max(1, row_size))
+    for start in range(0, n_rows, step):
+        yield slice(start, min(start + step, n_rows))
+
+
+def histogram(
+    stack: np.ndarray, lo: float, hi: float, bins: int = HISTOGRAM_BINS
+) -> Dict[str, Any]:
+    """
+    Histogram of the whole stack over [lo, hi], computed chunk by chunk.
+
+    ``lo`` and ``hi`` are the finite extrema (RunningStats); non-finite pixels
+    fall outside every bin and are reported as ``nonfinite``.
+    """
+    counts = np.zeros(bins, dtype=np.int64)
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        lo, hi = 0.0, 1.0  # No finite pixel
+    if not hi > lo:
+        hi = lo + 1.0
+    for plane in stack:
+        for rows in row_chunks(plane.shape[0], plane[0].size):
+            counts += np.histogram(plane[rows], bins=bins, range=(lo, hi))[0]
+    return {
+        "min": float(lo),
+        "max": float(hi),
+        "counts": counts.tolist(),
+        "nonfinite": int(stack.size - counts.sum()),
+    }
+
+
+def collection_stats(per_image: List[RunningStats]) -> RunningStats:
+    total = RunningStats()
+    for stats in per_image:
+        total.merge(stats)
+    return total
@@ -0,0 +1,187 @@
+"""
+Parameter sweeps over optical config fields.
+
+A sweep fits the same images for every point of a grid (or a list of zipped
+values) of OpticalConfigRequest fields and returns one table row per point.
+
+Points are ordered so that consecutive points are grid neighbours (each axis
+runs back and forth within the one before it), then cut into as many
+contiguous chains as there are workers. Chains run in parallel; within a chain
+each point starts from the previous point's solution (phase, defocus, optical
+axis, illumination), and Opticsetups are copied instead of rebuilt when only
+fields applied as plain attributes (defoc_z, object_fwhm_pix) change between
+points.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import math
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.image_store import ImageStore
+from app.models import OpticalConfigRequest, SearchPhaseRequest
+from app.pipeline import get_or_create_opticsetup, run_search
+
+logger = logging.getLogger(__name__)
+
+MAX_POINTS = 256
+
+# Config fields set as Opticsetup attributes of the same name: a setup built
+# for another value can be copied and updated instead of rebuilt
+ATTRIBUTE_FIELDS = ("defoc_z", "object_fwhm_pix")
+INITIAL_FIELDS = {
+    name for name in OpticalConfigRequest.model_fields if name.startswith("initial_")
+}
+# Fields of the previous solution carried over to the next point
+WARM_START_FIELDS = {
+    "phase": "initial_phase",
+    "defoc_z": "initial_defoc_z",
+    "optax_x": "initial_optax_x",
+    "optax_y": "initial_optax_y",
+    "illum": "initial_illum",
+}
+
+
+def sweep_size(values: Dict[str, List[Any]], mode: str = "grid") -> int:
+    """Number of points of the sweep, without building them"""
+    if mode == "zip":
+        lengths = {len(v) for v in values.values()}
+        if len(lengths) != 1:
+            raise ValueError("zip sweeps need value lists of the same length")
+        return lengths.pop()
+    return math.prod(len(v) for v in values.values())
+
+
+def sweep_points(
+    values: Dict[str, List[Any]], mode: str = "grid"
+) -> List[Dict[str, Any]]:
+    """
+    Points of the sweep, in an order where consecutive points are neighbours.
+
+    ``grid`` takes the product of all value lists, ``zip`` pairs them up.
+    """
+    fields = list(values)
+    if mode == "zip":
+        sweep_size(values, mode)  # Same lengths
+        return [dict(zip(fields, combo)) for combo in zip(*values.values())]
+
+    return [dict(zip(fields, combo)) for combo in _snake(list(values.values()))]
+
+
+def _snake(axes: List[List[Any]]) -> List[tuple]:
+    """Product of ``axes`` where each inner block alternates direction"""
+    if len(axes) == 1:
+        return [(value,) for value in axes[0]]
+    inner = _snake(axes[1:])
+    return [
+        (value,) + rest
+        for i, value in enumerate(axes[0])
+        for rest in (inner if i % 2 == 0 else inner[::-1])
+    ]
+
+
+def split_chains(points: List[Any], n_chains: int) -> List[List[Any]]:
+    """Cut ``points`` into at most ``n_chains`` contiguous, balanced chains"""
+    n_chains = max(1, min(n_chains, len(points)))
+    bounds = np.linspace(0, len(points), n_chains + 1).round().astype(int)
+    return [points[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+class SetupTemplates:
+    """Build Opticsetups once per geometry and hand out copies"""
+
+    def __init__(self):
+        self._templates: Dict[str, Any] = {}
+
+    @staticmethod
+    def key(img_array: np.ndarray, config: OpticalConfigRequest) -> str:
+        geometry = config.model_dump(exclude=set(ATTRIBUTE_FIELDS) | INITIAL_FIELDS)
+        digest = hashlib.sha256(ImageStore.content_id(img_array).encode("ascii"))
+        digest.update(json.dumps(geometry, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def __call__(self, img_array: np.ndarray, config: OpticalConfigRequest, log):
+        key = self.key(img_array, config)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = get_or_create_opticsetup(
+                img_array, config, log
+            )
+        else:
+            log.info("♻️  Reusing the Opticsetup of a previous sweep point")
+        opticsetup = copy.deepcopy(template)
+        opticsetup.defoc_z = np.array(config.defoc_z, dtype=float)
+        opticsetup.object_fwhm_pix = config.object_fwhm_pix
+        return opticsetup
+
+
+def warm_start(
+    config: OpticalConfigRequest,
+    previous: OpticalConfigRequest,
+    results: Dict[str, Any],
+    swept: List[str],
+) -> OpticalConfigRequest:
+    """Start ``config`` from the solution found at the previous point"""
+    update = {}
+    for result_field, initial_field in WARM_START_FIELDS.items():
+        if result_field in swept:
+            continue
+        value = np.asarray(results[result_field], dtype=float)
+        if result_field == "phase":
+            # Same wavefront in radians at the new wavelength
+            value = value * previous.wvl / config.wvl
+        update[initial_field] = value.tolist()
+    return config.model_copy(update=update)
+
+
+def row(point: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    results = response["results"]
+    rms = results["rms_stats"]
+    return {
+        "point": point,
+        "chi2": results["chi2"],
+        "rms_nm": rms["raw"],
+        "weighted_rms_nm": rms["weighted"],
+        "weighted_rms_notiltdef_nm": rms["weighted_notiltdef"],
+        "iterations": response["search_stats"]["iterations"],
+        "duration_ms": response["duration_ms"],
+        "truncated": response["truncated"],
+        "error": None,
+    }
+
+
+def run_sweep_chain(
+    img_array: np.ndarray,
+    request: SearchPhaseRequest,
+    points: List[Dict[str, Any]],
+    warm: bool = True,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> List[Dict[str, Any]]:
+    """Run consecutive sweep points in this process, each seeding the next"""
+    templates = SetupTemplates()
+    base = request.config.model_dump()
+    rows = []
+    previous = None  # (config, results) of the last successful point
+    for point in points:
+        config = OpticalConfigRequest(**{**base, **point})
+        if warm and previous is not None:
+            config = warm_start(config, previous[0], previous[1], list(point))
+        logger.info(f"🧭 Sweep point {point}")
+        try:
+            response = run_search(
+                img_array,
+                request.model_copy(update={"config": config}),
+                should_stop,
+                build=templates,
+            )
+        except Exception as e:
+            logger.error(f"❌ Sweep point {point} failed: {e}")
+            rows.append({"point": point, "error": str(e)})
+            continue
+        rows.append(row(point, response))
+        previous = (config, response["results"])
+    return rows
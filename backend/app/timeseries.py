@@ -0,0 +1,128 @@
+"""
+Time-series phase searches.
+
+A time series is a sequence of frames of K images each (a T x K cube), all
+taken with the same optical config. Frames are fitted in order and every fit
+starts from the solution of the previous frame through the initial_* fields,
+so a slowly evolving wavefront needs only a few iterations per frame. Results
+are handed out frame by frame as soon as each fit completes.
+
+The Opticsetup itself is still built per frame: the core derives its state
+(centring, cropped images) from the frame's images, so only the fitted
+solution is carried over.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.models import SearchPhaseRequest, TimeSeriesRequest
+
+logger = logging.getLogger(__name__)
+
+# Fields of the previous frame's solution carried over to the next frame
+WARM_START_FIELDS = {
+    "phase": "initial_phase",
+    "illum": "initial_illum",
+    "defoc_z": "initial_defoc_z",
+    "optax_x": "initial_optax_x",
+    "optax_y": "initial_optax_y",
+    "focscale": "initial_focscale",
+    "object_fwhm_pix": "initial_object_fwhm_pix",
+    "amplitude": "initial_amplitude",
+    "background": "initial_background",
+}
+
+
+def frame_size(request: SearchPhaseRequest, images_per_frame: Optional[int]) -> int:
+    """Images per frame: explicit, else one per defocus value of the config"""
+    return images_per_frame or len(request.config.defoc_z)
+
+
+def split_frames(img_array: np.ndarray, images_per_frame: int) -> List[np.ndarray]:
+    """Cut an [T * K, H, W] stack into T frames of K images"""
+    if len(img_array) % images_per_frame:
+        raise ValueError(
+            f"{len(img_array)} images do not make frames of {images_per_frame}"
+        )
+    return [
+        img_array[i : i + images_per_frame]
+        for i in range(0, len(img_array), images_per_frame)
+    ]
+
+
+class TimeSeries:
+    """Requests and per-frame rows of a sequence of warm-started fits"""
+
+    def __init__(self, request: SearchPhaseRequest, warm: bool = True):
+        self.request = request
+        self.warm = warm
+        self.frame = 0
+        self.failed = 0
+        self.iterations = 0
+        self._previous: Optional[Dict[str, Any]] = None  # results of the last fit
+
+    @classmethod
+    def from_request(cls, request: TimeSeriesRequest) -> "TimeSeries":
+        fields = {"images", "image_id", "image_indices", "images_per_frame"}
+        search = SearchPhaseRequest(
+            **request.model_dump(exclude=fields | {"warm_start"})
+        )
+        # Rows only hold coefficients and statistics: leave the maps out
+        search.result_arrays = []
+        return cls(search, request.warm_start)
+
+    def next_request(self) -> SearchPhaseRequest:
+        """Request of the next frame, seeded by the last successful fit"""
+        if not self.warm or self._previous is None:
+            return self.request
+        update = {}
+        for result_field, initial_field in WARM_START_FIELDS.items():
+            value = np.asarray(self._previous[result_field], dtype=float)
+            update[initial_field] = value.tolist()
+        config = self.request.config.model_copy(update=update)
+        return self.request.model_copy(update={"config": config})
+
+    def record(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Row of a completed frame; its solution seeds the next frame"""
+        results = response["results"]
+        rms = results["rms_stats"]
+        iterations = response["search_stats"]["iterations"]
+        row = {
+            "frame": self.frame,
+            "warm_started": self.warm and self._previous is not None,
+            "chi2": results["chi2"],
+            "phase": results["phase"],
+            "defoc_z": results["defoc_z"],
+            "optax_x": results["optax_x"],
+            "optax_y": results["optax_y"],
+            "focscale": results["focscale"],
+            "weighted_rms_nm": rms["weighted"],
+            "weighted_rms_notiltdef_nm": rms["weighted_notiltdef"],
+            "iterations": iterations,
+            "duration_ms": response["duration_ms"],
+            "truncated": response["truncated"],
+            "error": None,
+        }
+        self._previous = results
+        self.frame += 1
+        self.iterations += iterations
+        return row
+
+    def record_error(self, error: BaseException) -> Dict[str, Any]:
+        """Row of a failed frame; the next frame starts from the last good fit"""
+        logger.error(f"❌ Frame {self.frame} failed: {error}")
+        row = {"frame": self.frame, "error": str(error)}
+        self.frame += 1
+        self.failed += 1
+        return row
+
+    def summary(self) -> Dict[str, Any]:
+        succeeded = self.frame - self.failed
+        return {
+            "frames": self.frame,
+            "succeeded": succeeded,
+            "failed": self.failed,
+            "mean_iterations": self.iterations / succeeded if succeeded else None,
+        }
@@ -0,0 +1,238 @@
+"""
+Binary wire format for image stacks and result arrays.
+
+Arrays travel as NPY bytes (little-endian, shape and dtype in the NPY header)
+inside multipart/form-data bodies, next to a JSON part that carries everything
+else. The JSON-only path stays available: clients opt in to binary requests by
+sending multipart/form-data, and to binary responses with an
+``Accept: multipart/form-data`` header.
+"""
+
+import io
+import json
+import uuid
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from pydantic import BaseModel, ValidationError
+from pydantic.json_schema import models_json_schema
+
+NPY_MEDIA_TYPE = "application/x-npy"
+MULTIPART_MEDIA_TYPE = "multipart/form-data"
+
+# Name of the JSON form field holding the request model in multipart requests
+REQUEST_FIELD = "request"
+# Name of the JSON part holding the non-array response fields
+METADATA_FIELD = "metadata"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Models read with read_request_model, published by add_request_schemas
+_request_models: Dict[str, Type[BaseModel]] = {}
+
+
+def encode_npy(array: np.ndarray) -> bytes:
+    """Serialize an array to little-endian NPY bytes."""
+    array = np.asarray(array)
+    if array.dtype.byteorder == ">":
+        array = array.astype(array.dtype.newbyteorder("<"))
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_npy(data: bytes) -> np.ndarray:
+    """Deserialize NPY bytes, rejecting pickled object arrays."""
+    try:
+        return np.load(io.BytesIO(data), allow_pickle=False)
+    except (ValueError, OSError, EOFError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid NPY payload: {e}")
+
+
+def is_multipart(request: Request) -> bool:
+    return request.headers.get("content-type", "").startswith(MULTIPART_MEDIA_TYPE)
+
+
+def wants_binary(request: Request) -> bool:
+    """True if the client asked for a multipart (NPY) response."""
+    return MULTIPART_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def read_request_model(
+    request: Request, model_cls: Type[ModelT]
+) -> Tuple[ModelT, Dict[str, np.ndarray]]:
+    """
+    Parse a request body that is either plain JSON or multipart/form-data.
+
+    Multipart bodies carry the model as JSON in the ``request`` field and any
+    number of NPY file parts, returned by field name. JSON bodies return no
+    arrays.
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    try:
+        if is_multipart(request):
+            form = await request.form()
+            raw = form.get(REQUEST_FIELD)
+            if raw is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Multipart body is missing the '{REQUEST_FIELD}' field",
+                )
+            if not isinstance(raw, str):
+                raw = (await raw.read()).decode("utf-8")
+            model = model_cls.model_validate_json(raw)
+            for name, value in form.multi_items():
+                if name != REQUEST_FIELD and not isinstance(value, str):
+                    arrays[name] = decode_npy(await value.read())
+        else:
+            model = model_cls.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return model, arrays
+
+
+def request_body(
+    model_cls: Type[BaseModel], arrays: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    ``openapi_extra`` documenting a body read with read_request_model.
+
+    ``arrays`` maps the NPY part names accepted in multipart bodies to their
+    description (default: the image stack in ``images``).
+    """
+    if arrays is None:
+        arrays = {"images": "Image stack [N, H, W] as NPY"}
+    _request_models[model_cls.__name__] = model_cls
+    multipart = {
+        REQUEST_FIELD: {
+            "type": "string",
+            "description": f"{model_cls.__name__} as JSON",
+        }
+    }
+    for name, description in arrays.items():
+        multipart[name] = {
+            "type": "string",
+            "format": "binary",
+            "description": description,
+        }
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"$ref": f"#/components/schemas/{model_cls.__name__}"}
+                },
+                MULTIPART_MEDIA_TYPE: {
+                    "schema": {
+                        "type": "object",
+                        "required": [REQUEST_FIELD],
+                        "properties": multipart,
+                    }
+                },
+            },
+        }
+    }
+
+
+def add_request_schemas(openapi: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the models referenced by request_body to an OpenAPI schema"""
+    _, schemas = models_json_schema(
+        [(model, "validation") for model in _request_models.values()],
+        ref_template="#/components/schemas/{model}",
+    )
+    components = openapi.setdefault("components", {}).setdefault("schemas", {})
+    for name, schema in schemas.get("$defs", {}).items():
+        components.setdefault(name, schema)
+    return openapi
+
+
+def to_jsonable(value: Any) -> Any:
+    """
+    Recursively convert numpy arrays and scalars to plain Python types.
+
+    NaN and infinite entries of float arrays (masked map pixels, bad image
+    pixels) become None, as JSON has neither.
+    """
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == "f" and not np.isfinite(value).all():
+            return np.where(np.isfinite(value), value.astype(object), None).tolist()
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    return value
+
+
+def split_arrays(
+    value: Any, prefix: str = "", min_ndim: int = 2
+) -> Tuple[Any, Dict[str, np.ndarray]]:
+    """
+    Pull arrays with ``ndim >= min_ndim`` out of a nested dict.
+
+    Returns the remaining JSON-compatible structure and the extracted arrays,
+    keyed by their dotted path (e.g. ``results.phase_map``).
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    if isinstance(value, dict):
+        remaining = {}
+        for key, item in value.items():
+            path = f"{prefix}.{key}" if prefix else key
+            if isinstance(item, np.ndarray) and item.ndim >= min_ndim:
+                arrays[path] = item
+            else:
+                remaining[key], nested = split_arrays(item, path, min_ndim)
+                arrays.update(nested)
+        return remaining, arrays
+    return to_jsonable(value), arrays
+
+
+def multipart_response(payload: Dict[str, Any], min_ndim: int = 2) -> Response:
+    """
+    Encode a response payload as multipart/form-data.
+
+    The ``metadata`` part holds the JSON fields; every large array becomes its
+    own NPY part named after its dotted path in the payload.
+    """
+    metadata, arrays = split_arrays(payload, min_ndim=min_ndim)
+    boundary = uuid.uuid4().hex
+    chunks = [
+        _form_part(
+            boundary,
+            METADATA_FIELD,
+            "application/json",
+            json.dumps(metadata).encode("utf-8"),
+        )
+    ]
+    for name, array in arrays.items():
+        chunks.append(
+            _form_part(boundary, name, NPY_MEDIA_TYPE, encode_npy(array), f"{name}.npy")
+        )
+    chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+    return Response(
+        content=b"".join(chunks),
+        media_type=f"{MULTIPART_MEDIA_TYPE}; boundary={boundary}",
+    )
+
+
+def _form_part(
+    boundary: str,
+    name: str,
+    content_type: str,
+    body: bytes,
+    filename: Optional[str] = None,
+) -> bytes:
+    disposition = f'form-data; name="{name}"'
+    if filename:
+        disposition += f'; filename="{filename}"'
+    header = (
+        f"--{boundary}\r\n"
+        f"Content-Disposition: {disposition}\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    )
+    return header.encode("ascii") + body + b"\r\n"
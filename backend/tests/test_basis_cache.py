@@ -0,0 +1,94 @@
+"""
+A setup given a cached basis must match a setup built directly with that
+basis: the cache assumes no other Opticsetup attribute depends on the basis.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+pytest.importorskip("app.core.diversity")
+
+from app import pipeline  # noqa: E402
+from app.basis_cache import CACHED_BASES, BasisDiskCache  # noqa: E402
+from app.models import OpticalConfigRequest  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def defocused_stack(size=64):
+    y, x = np.mgrid[:size, :size] - size / 2
+    r2 = x**2 + y**2
+    return np.stack([np.exp(-r2 / (2 * s**2)) for s in (3.0, 5.0)]) * 1000.0
+
+
+def assert_same_setup(expected, actual):
+    assert sorted(vars(expected)) == sorted(vars(actual))
+    for name, value in vars(expected).items():
+        other = getattr(actual, name)
+        if callable(value):
+            continue
+        if isinstance(value, (np.ndarray, list, tuple)) or np.isscalar(value):
+            np.testing.assert_array_equal(
+                np.asarray(other), np.asarray(value), err_msg=name
+            )
+        else:
+            assert other == value, name
+
+
+@pytest.mark.parametrize("basis", CACHED_BASES)
+def test_transplanted_basis_matches_direct_build(basis, tmp_path, monkeypatch):
+    cache = BasisDiskCache(tmp_path, max_bytes=1024**3)
+    monkeypatch.setattr(pipeline, "basis_cache", cache)
+    images = defocused_stack()
+    config = OpticalConfigRequest(defoc_z=[0.0, 1e-3], basis=basis, Jmax=15)
+
+    direct = pipeline.create_opticsetup_with_mocked_io(images, config, logger)
+    pipeline.get_or_create_opticsetup(images, config, logger)  # miss: stores it
+    assert cache.knows(config)
+    transplanted = pipeline.get_or_create_opticsetup(images, config, logger)
+
+    assert_same_setup(direct, transplanted)
+
+
+def test_miss_builds_the_setup_once(tmp_path, monkeypatch):
+    cache = BasisDiskCache(tmp_path, max_bytes=1024**3)
+    monkeypatch.setattr(pipeline, "basis_cache", cache)
+    built = []
+    create = pipeline.create_opticsetup_with_mocked_io
+
+    def counting_create(img_array, config, logger):
+        built.append(config.basis)
+        return create(img_array, config, logger)
+
+    monkeypatch.setattr(pipeline, "create_opticsetup_with_mocked_io", counting_create)
+    config = OpticalConfigRequest(defoc_z=[0.0, 1e-3], basis="eigen", Jmax=15)
+
+    pipeline.get_or_create_opticsetup(defocused_stack(), config, logger)
+    assert built == ["eigen"]
+
+
+def test_concurrent_misses_build_the_basis_once(tmp_path, monkeypatch):
+    cache = BasisDiskCache(tmp_path, max_bytes=1024**3)
+    monkeypatch.setattr(pipeline, "basis_cache", cache)
+    built = []
+    create = pipeline.create_opticsetup_with_mocked_io
+
+    def counting_create(img_array, config, logger):
+        built.append(config.basis)
+        return create(img_array, config, logger)
+
+    monkeypatch.setattr(pipeline, "create_opticsetup_with_mocked_io", counting_create)
+    config = OpticalConfigRequest(defoc_z=[0.0, 1e-3], basis="eigen", Jmax=15)
+    images = defocused_stack()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(
+            pool.map(
+                lambda _: pipeline.get_or_create_opticsetup(images, config, logger),
+                range(4),
+            )
+        )
+    assert built.count("eigen") == 1
@@ -0,0 +1,48 @@
+"""Columnar result table of the CLI batch runner"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("app.core.diversity")
+
+from app.cli import _column, build_table  # noqa: E402
+
+
+def test_scalars_stack_into_a_vector():
+    np.testing.assert_array_equal(_column([1.0, 2.5, 3.0]), [1.0, 2.5, 3.0])
+
+
+def test_missing_values_become_nan():
+    column = _column([1.0, None, 3.0])
+    assert column[0] == 1.0 and np.isnan(column[1]) and column[2] == 3.0
+
+
+def test_shorter_vectors_are_nan_padded():
+    column = _column([np.arange(3.0), None, np.arange(5.0)])
+
+    assert column.shape == (3, 5)
+    np.testing.assert_array_equal(column[0, :3], [0.0, 1.0, 2.0])
+    assert np.isnan(column[0, 3:]).all() and np.isnan(column[1]).all()
+    np.testing.assert_array_equal(column[2], np.arange(5.0))
+
+
+def test_float32_maps_stay_float32():
+    maps = [np.ones((4, 4), dtype=np.float32), np.ones((2, 6), dtype=np.float32)]
+    column = _column(maps)
+
+    assert column.dtype == np.float32 and column.shape == (2, 4, 6)
+    assert np.isnan(column[0, :, 4:]).all() and np.isnan(column[1, 2:]).all()
+
+
+def test_all_failed_column_is_nan():
+    assert np.isnan(_column([None, None])).all()
+
+
+def test_table_keeps_one_row_per_file():
+    rows = [{"chi2": 1.0, "phase": np.zeros(3)}, ValueError("bad file")]
+    table = build_table(["a.fits", "b.fits"], rows)
+
+    np.testing.assert_array_equal(table["ok"], [True, False])
+    assert list(table["error"]) == ["", "bad file"]
+    assert table["chi2"][0] == 1.0 and np.isnan(table["chi2"][1])
+    assert table["phase"].shape == (2, 3)
@@ -0,0 +1,46 @@
+"""Binning of the coarse stage"""
+
+import numpy as np
+import pytest
+
+from app.coarse_to_fine import bin_images, sampling_factor, usable_factor
+from app.models import OpticalConfigRequest
+
+
+def config(**fields):
+    return OpticalConfigRequest(defoc_z=[0.0, 1e-3], **fields)
+
+
+def test_bin_images_averages_blocks():
+    images = np.arange(2 * 4 * 6, dtype=float).reshape(2, 4, 6)
+    binned = bin_images(images, 2)
+
+    assert binned.shape == (2, 2, 3)
+    assert binned[0, 0, 0] == pytest.approx(np.mean(images[0, :2, :2]))
+    assert binned[1, 1, 2] == pytest.approx(np.mean(images[1, 2:, 4:]))
+
+
+def test_bin_images_crops_the_edges():
+    images = np.ones((3, 7, 9))
+    binned = bin_images(images, 3)
+    assert binned.shape == (3, 2, 3)
+    np.testing.assert_array_equal(binned, 1.0)
+
+
+def test_bin_images_preserves_the_mean_flux_per_pixel():
+    images = np.random.default_rng(0).random((2, 32, 32))
+    assert bin_images(images, 4).mean() == pytest.approx(images.mean())
+
+
+def test_usable_factor_keeps_nyquist_sampling():
+    # sampling = wvl * fratio / pixelSize = 8: binning by 4 keeps 2 per pixel
+    cfg = config(wvl=500e-9, fratio=16.0, pixelSize=1e-6)
+    assert sampling_factor(cfg) == pytest.approx(8.0)
+    assert usable_factor(cfg, 4) == 4
+    assert usable_factor(cfg, 6) == 4
+    assert usable_factor(cfg, 1) == 1
+
+
+def test_usable_factor_refuses_undersampled_binning():
+    cfg = config(wvl=550e-9, fratio=18.0, pixelSize=7.4e-6)  # sampling ~1.34
+    assert usable_factor(cfg, 2) == 1
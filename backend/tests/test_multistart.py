@@ -0,0 +1,50 @@
+"""Starting points of multi-start searches"""
+
+import numpy as np
+
+from app.multistart import DEFOCUS_INDEX, LOW_ORDER_MODES, StartPoint, starting_phase
+
+
+def test_start_zero_keeps_the_request_phase():
+    phase = np.arange(15.0)
+    np.testing.assert_array_equal(starting_phase(phase, StartPoint(0)), phase)
+
+
+def test_starts_one_and_two_set_both_defocus_signs():
+    phase = np.ones(15)
+    plus = starting_phase(phase, StartPoint(1, amplitude=0.3))
+    minus = starting_phase(phase, StartPoint(2, amplitude=0.3))
+
+    assert plus[DEFOCUS_INDEX] == 0.3 and minus[DEFOCUS_INDEX] == -0.3
+    others = np.arange(phase.size) != DEFOCUS_INDEX
+    np.testing.assert_array_equal(plus[others], phase[others])
+    np.testing.assert_array_equal(minus[others], phase[others])
+
+
+def test_random_starts_perturb_low_orders_only():
+    phase = np.zeros(40)
+    start = starting_phase(phase, StartPoint(3, amplitude=0.5, seed=7))
+
+    low = slice(DEFOCUS_INDEX, DEFOCUS_INDEX + LOW_ORDER_MODES)
+    assert np.all(start[low] != 0.0)
+    assert np.all(start[:DEFOCUS_INDEX] == 0.0)  # tip/tilt untouched
+    assert np.all(start[low.stop :] == 0.0)
+
+
+def test_random_starts_are_reproducible_and_distinct():
+    phase = np.zeros(20)
+    first = starting_phase(phase, StartPoint(3, seed=1))
+    np.testing.assert_array_equal(first, starting_phase(phase, StartPoint(3, seed=1)))
+    assert not np.array_equal(first, starting_phase(phase, StartPoint(4, seed=1)))
+
+
+def test_input_phase_is_not_modified():
+    phase = np.zeros(20)
+    starting_phase(phase, StartPoint(1))
+    starting_phase(phase, StartPoint(5, seed=0))
+    assert not phase.any()
+
+
+def test_short_phase_vectors_are_returned_unchanged():
+    phase = np.array([0.1, 0.2])
+    np.testing.assert_array_equal(starting_phase(phase, StartPoint(4, seed=0)), phase)
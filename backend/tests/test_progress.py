@@ -0,0 +1,111 @@
+"""Accept/reject classification of SearchMonitor"""
+
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("app.core.diversity")
+
+from app.progress import (  # noqa: E402
+    SearchInterrupted,
+    SearchMonitor,
+    free_parameter_count,
+)
+
+
+def setup(n_images=2, size=4):
+    return SimpleNamespace(img=np.ones((n_images, size, size)))
+
+
+def model(opticsetup, coeffs):
+    """Model images whose chi2 grows with the coefficients"""
+    return opticsetup.img.ravel() * (1.0 + np.sum(coeffs))
+
+
+def probe(point, k, h=1e-6):
+    coeffs = point.copy()
+    coeffs[k] += h
+    return coeffs
+
+
+def events(caplog):
+    return [r.progress for r in caplog.records if hasattr(r, "progress")]
+
+
+def test_trial_accepted_when_the_core_probes_around_it(caplog):
+    caplog.set_level(logging.INFO, logger="app.progress")
+    optic = setup()
+    monitor = SearchMonitor(optic, free_parameters=3)
+    base = np.zeros(3)
+    for coeffs in [base, probe(base, 0), probe(base, 1), probe(base, 2)]:
+        monitor.observe(coeffs, model(optic, coeffs))
+
+    rejected = base + 0.1
+    accepted = base + 0.05
+    final = accepted + 0.01
+    for coeffs in [
+        rejected,  # trial step
+        base,  # back at the old point: rejected
+        accepted,  # another trial step
+        probe(accepted, 0),  # Jacobian around it: accepted
+        probe(accepted, 1),
+        final,
+    ]:
+        monitor.observe(coeffs, model(optic, coeffs))
+    monitor.finish(final)
+
+    stats = monitor.stats()
+    assert (stats["iterations"], stats["trials"]) == (2, 3)
+    np.testing.assert_array_equal(monitor.base_coeffs, final)
+    assert monitor.psfs_for(final) is not None
+    assert [e["accepted"] for e in events(caplog)] == [True, False, True, True]
+    assert all("lambda" not in e for e in events(caplog))
+
+
+def test_last_trial_rejected_when_the_core_ends_elsewhere():
+    optic = setup()
+    monitor = SearchMonitor(optic, free_parameters=2)
+    base = np.zeros(2)
+    monitor.observe(base, model(optic, base))
+    trial = base + 0.1
+    monitor.observe(trial, model(optic, trial))
+    monitor.finish(base)
+
+    assert monitor.stats()["iterations"] == 0
+    np.testing.assert_array_equal(monitor.base_coeffs, base)
+
+
+def test_single_free_coefficient_falls_back_to_chi2():
+    optic = setup()
+    monitor = SearchMonitor(optic, free_parameters=1)
+    for value in [1.0, 0.5, 0.8, 0.2]:
+        coeffs = np.array([value])
+        monitor.observe(coeffs, model(optic, coeffs))
+
+    assert monitor.stats()["iterations"] == 2
+    np.testing.assert_array_equal(monitor.base_coeffs, [0.2])
+
+
+def test_max_iterations_fires_with_a_single_free_coefficient():
+    optic = setup()
+    monitor = SearchMonitor(optic, free_parameters=1, max_iterations=2)
+    with pytest.raises(SearchInterrupted, match="max_iterations"):
+        for value in [1.0, 0.5, 0.2, 0.1]:
+            coeffs = np.array([value])
+            monitor.observe(coeffs, model(optic, coeffs))
+    assert monitor.stats()["iterations"] == 2
+
+
+def test_free_parameter_count():
+    optic = SimpleNamespace(
+        defoc_z=[0.0, 1e-3],
+        focscale=1.0,
+        optax_x=np.zeros(2),
+        optax_y=np.zeros(2),
+        phase=np.zeros(10),
+    )
+    assert free_parameter_count(optic, phase_flag=True) == 10
+    assert free_parameter_count(optic, optax_flag=True, focscale_flag=True) == 5
+    assert free_parameter_count(optic, phase_flag=False) == 0
@@ -0,0 +1,76 @@
+"""Single-pass statistics against numpy's multi-pass results"""
+
+import numpy as np
+import pytest
+
+from app.stats import RunningStats, collection_stats, histogram, row_chunks
+
+
+def streamed(image, row_size=None):
+    stats = RunningStats()
+    for rows in row_chunks(image.shape[0], row_size or image[0].size):
+        stats.update(image[rows])
+    return stats
+
+
+def test_chunked_update_matches_numpy():
+    image = np.random.default_rng(0).normal(100.0, 5.0, size=(300, 257))
+    stats = streamed(image, row_size=10_000)
+
+    assert stats.count == image.size
+    assert stats.min == image.min() and stats.max == image.max()
+    assert stats.mean == pytest.approx(np.mean(image), rel=1e-12)
+    assert stats.std**2 == pytest.approx(np.var(image), rel=1e-10)
+
+
+def test_merge_matches_numpy_on_the_whole_collection():
+    rng = np.random.default_rng(1)
+    images = [rng.normal(loc, 1.0 + loc, size=(64, 80)) for loc in (0.0, 3.0, 50.0)]
+    total = collection_stats([streamed(image) for image in images])
+
+    everything = np.stack(images)
+    assert total.count == everything.size
+    assert total.mean == pytest.approx(np.mean(everything), rel=1e-12)
+    assert total.std**2 == pytest.approx(np.var(everything), rel=1e-10)
+    assert (total.min, total.max) == (everything.min(), everything.max())
+
+
+def test_merge_of_empty_stats_is_a_no_op():
+    stats = streamed(np.arange(12.0).reshape(3, 4))
+    before = stats.summary()
+    stats.merge(RunningStats())
+    assert stats.summary() == before
+
+
+def test_nonfinite_pixels_are_counted_apart():
+    image = np.arange(20.0).reshape(4, 5)
+    image[0, 0] = np.nan
+    image[2, 3] = np.inf
+    image[3, 4] = -np.inf
+    stats = streamed(image, row_size=5)
+
+    finite = image[np.isfinite(image)]
+    assert stats.nonfinite == 3
+    assert stats.count == finite.size
+    assert (stats.min, stats.max) == (finite.min(), finite.max())
+    assert stats.mean == pytest.approx(finite.mean())
+
+
+def test_histogram_skips_nonfinite_pixels():
+    stack = np.ones((2, 4, 4))
+    stack[0, 1, 1] = np.nan
+    stack[1, 2, 2] = np.inf
+    stack[1, 3, 3] = 3.0
+    stats = collection_stats([streamed(image) for image in stack])
+
+    result = histogram(stack, stats.min, stats.max, bins=4)
+    assert (result["min"], result["max"]) == (1.0, 3.0)
+    assert sum(result["counts"]) == stack.size - 2
+    assert result["nonfinite"] == 2
+
+
+def test_all_nonfinite_image_has_a_json_safe_summary():
+    stats = streamed(np.full((3, 3), np.nan))
+    assert stats.summary()["min"] is None
+    assert stats.summary()["nonfinite"] == 9
+    assert histogram(np.full((1, 3, 3), np.nan), stats.min, stats.max)["nonfinite"] == 9
@@ -0,0 +1,62 @@
+"""Sweep point generation and chain splitting"""
+
+import pytest
+
+pytest.importorskip("app.core.diversity")
+
+from app.sweep import split_chains, sweep_points, sweep_size  # noqa: E402
+
+
+def test_grid_covers_the_product_in_snake_order():
+    values = {"wvl": [1, 2], "Jmax": [10, 20, 30]}
+    points = sweep_points(values)
+
+    assert len(points) == sweep_size(values) == 6
+    assert [(p["wvl"], p["Jmax"]) for p in points] == [
+        (1, 10),
+        (1, 20),
+        (1, 30),
+        (2, 30),
+        (2, 20),
+        (2, 10),
+    ]
+
+
+def test_grid_neighbours_differ_in_one_field():
+    values = {"a": [0, 1, 2], "b": [0, 1], "c": [0, 1, 2, 3]}
+    points = sweep_points(values)
+    assert len({tuple(p.values()) for p in points}) == sweep_size(values) == 24
+    for previous, point in zip(points, points[1:]):
+        assert sum(previous[k] != point[k] for k in values) == 1
+
+
+def test_zip_pairs_values():
+    values = {"wvl": [1, 2, 3], "fratio": [10, 20, 30]}
+    assert sweep_size(values, "zip") == 3
+    assert sweep_points(values, "zip") == [
+        {"wvl": 1, "fratio": 10},
+        {"wvl": 2, "fratio": 20},
+        {"wvl": 3, "fratio": 30},
+    ]
+
+
+def test_zip_rejects_lists_of_different_lengths():
+    with pytest.raises(ValueError):
+        sweep_size({"wvl": [1, 2], "fratio": [1]}, "zip")
+    with pytest.raises(ValueError):
+        sweep_points({"wvl": [1, 2], "fratio": [1]}, "zip")
+
+
+def test_size_of_a_large_grid_is_computed_without_building_it():
+    assert sweep_size({"a": list(range(1000)), "b": list(range(1000))}) == 10**6
+
+
+@pytest.mark.parametrize("n_points, n_chains", [(10, 3), (7, 7), (3, 8), (1, 4)])
+def test_split_chains_is_contiguous_and_balanced(n_points, n_chains):
+    points = list(range(n_points))
+    chains = split_chains(points, n_chains)
+
+    assert [p for chain in chains for p in chain] == points
+    assert len(chains) == min(n_points, n_chains)
+    sizes = [len(chain) for chain in chains]
+    assert max(sizes) - min(sizes) <= 1
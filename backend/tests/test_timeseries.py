@@ -0,0 +1,74 @@
+"""Frame splitting and warm starts of time series"""
+
+import numpy as np
+import pytest
+
+from app.models import TimeSeriesRequest
+from app.timeseries import TimeSeries, frame_size, split_frames
+
+
+def request(**fields):
+    return TimeSeriesRequest(config={"defoc_z": [0.0, 1e-3]}, **fields)
+
+
+def response(phase, iterations=3):
+    results = {
+        "phase": np.asarray(phase),
+        "illum": [1.0],
+        "defoc_z": [0.0, 1e-3],
+        "optax_x": [0.0, 0.0],
+        "optax_y": [0.0, 0.0],
+        "focscale": 1.0,
+        "object_fwhm_pix": 0.0,
+        "amplitude": [1.0, 1.0],
+        "background": [0.0, 0.0],
+        "chi2": 1.0,
+        "rms_stats": {"weighted": 10.0, "weighted_notiltdef": 5.0},
+    }
+    return {
+        "results": results,
+        "search_stats": {"iterations": iterations},
+        "duration_ms": 1,
+        "truncated": False,
+    }
+
+
+def test_frame_size_defaults_to_one_image_per_defocus():
+    assert frame_size(request(), None) == 2
+    assert frame_size(request(), 4) == 4
+
+
+def test_split_frames():
+    frames = split_frames(np.zeros((6, 4, 4)), 2)
+    assert [f.shape for f in frames] == [(2, 4, 4)] * 3
+    with pytest.raises(ValueError):
+        split_frames(np.zeros((5, 4, 4)), 2)
+
+
+def test_each_frame_starts_from_the_previous_solution():
+    series = TimeSeries.from_request(request(images_per_frame=2))
+    assert series.next_request().config.initial_phase is None
+
+    series.record(response([0.1, 0.2, 0.3]))
+    assert series.next_request().config.initial_phase == [0.1, 0.2, 0.3]
+    assert series.next_request().result_arrays == []
+
+
+def test_failed_frames_keep_the_last_good_solution():
+    series = TimeSeries.from_request(request())
+    series.record(response([0.5], iterations=4))
+    series.record_error(RuntimeError("diverged"))
+
+    assert series.next_request().config.initial_phase == [0.5]
+    assert series.summary() == {
+        "frames": 2,
+        "succeeded": 1,
+        "failed": 1,
+        "mean_iterations": 4.0,
+    }
+
+
+def test_cold_start_ignores_previous_frames():
+    series = TimeSeries.from_request(request(warm_start=False))
+    series.record(response([0.5]))
+    assert series.next_request().config.initial_phase is None
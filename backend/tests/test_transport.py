@@ -0,0 +1,57 @@
+"""JSON and NPY conversion of result arrays"""
+
+import json
+
+import numpy as np
+
+from app.transport import decode_npy, encode_npy, split_arrays, to_jsonable
+
+
+def test_nan_pixels_become_null():
+    phase_map = np.array([[np.nan, 1.5], [2.0, np.nan]])
+    assert to_jsonable(phase_map) == [[None, 1.5], [2.0, None]]
+
+
+def test_infinite_pixels_become_null():
+    assert to_jsonable(np.array([np.inf, -np.inf, 0.5])) == [None, None, 0.5]
+
+
+def test_nested_values_are_plain_python_and_valid_json():
+    value = {
+        "results": {
+            "phase_map": np.array([np.nan, 1.0], dtype=np.float32),
+            "chi2": np.float64(2.5),
+            "iterations": np.int64(3),
+            "phase": [np.float32(0.25)],
+        }
+    }
+    converted = to_jsonable(value)
+
+    assert converted == {
+        "results": {
+            "phase_map": [None, 1.0],
+            "chi2": 2.5,
+            "iterations": 3,
+            "phase": [0.25],
+        }
+    }
+    json.dumps(converted, allow_nan=False)
+
+
+def test_integer_arrays_are_unchanged():
+    assert to_jsonable(np.arange(3)) == [0, 1, 2]
+
+
+def test_npy_round_trip_keeps_nan_and_dtype():
+    array = np.array([[np.nan, 1.0]], dtype=np.float32)
+    decoded = decode_npy(encode_npy(array))
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_split_arrays_pulls_out_maps_only():
+    rest, arrays = split_arrays(
+        {"results": {"phase_map": np.zeros((2, 2)), "phase": np.zeros(3)}}
+    )
+    assert list(arrays) == ["results.phase_map"]
+    assert "phase_map" not in rest["results"] and "phase" in rest["results"]
@@ -14,6 +14,9 @@ import {
   Upload01Icon,
 } from "@hugeicons/core-free-icons";
 
+// Keep in line with the backend's MAX_IMAGES; each file holds one image or more
+const MAX_FILES = Number(import.meta.env.VITE_MAX_IMAGES) || 100;
+
 interface ImageUploaderProps {
   onUploadComplete: (data: ParsedImages) => void;
 }
@@ -124,10 +127,11 @@ const ImageUploader: React.FC<ImageUploaderProps> = ({
         <Dropzone
           onDrop={handleFilesSelected}
           onError={(err) => setError(err.message)}
-          maxFiles={10}
+          maxFiles={MAX_FILES}
           accept={{
             "application/fits": [".fits", ".fit"],
-            "application/octet-stream": [".fits", ".fit"],
+            "application/octet-stream": [".fits", ".fit", ".npy", ".npz", ".raw"],
+            "application/json": [".json"],
           }}
           src={undefined}
           className="flex-1 min-h-0"
@@ -141,7 +145,7 @@ const ImageUploader: React.FC<ImageUploaderProps> = ({
                 />
               }
               title={files.length > 0 ? "Add more files" : "Upload images"}
-              description="Click to browse or drag and drop FITS (.fits, .fit) files (2-10 images required)"
+              description="Click to browse or drag and drop FITS (.fits, .fit) or NumPy (.npy, .npz) files (at least 2 images required)"
               accentColor="cyan"
             />
           </DropzoneEmptyState>
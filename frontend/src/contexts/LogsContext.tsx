@@ -70,18 +70,22 @@ export const LogsProvider: React.FC<LogsProviderProps> = ({ children }) => {
   };
 
   const handleMessage = (rawMessage: string) => {
-    const logEntry = parseLogMessage(rawMessage);
-
-    // Skip empty messages
-    if (!logEntry.message || logEntry.message.trim() === "") {
+    // The backend batches several "timestamp|message" lines per frame
+    const logEntries = rawMessage
+      .split("\n")
+      .map(parseLogMessage)
+      // Skip empty messages
+      .filter((entry) => entry.message && entry.message.trim() !== "");
+
+    if (logEntries.length === 0) {
       return;
     }
 
-    setLogs((prev) => [...prev, logEntry]);
+    setLogs((prev) => [...prev, ...logEntries]);
 
     // Use ref to get current value of isOpen (avoids closure issue)
     if (!isOpenRef.current) {
-      setUnreadCount((prev) => prev + 1);
+      setUnreadCount((prev) => prev + logEntries.length);
     }
   };
 
@@ -7,6 +7,17 @@ export interface DatasetStats {
   std: number;
   original_dtype: string;
   shape_consistent: boolean; // Confirme que toutes les images avaient la même taille
+  per_image?: ImageStats[]; // Stats de chaque image, indexées comme 'images'
+  histogram?: { min: number; max: number; counts: number[]; nonfinite?: number }; // Pour l'échelle d'affichage
+}
+
+// Stats d'une image de la collection
+export interface ImageStats {
+  min: number | null; // null si aucun pixel fini
+  max: number | null;
+  mean: number;
+  std: number;
+  nonfinite?: number; // Pixels NaN/inf, exclus des stats
 }
 
 // Interface pour les infos SPECIFIQUES à chaque image
@@ -21,7 +32,7 @@ export interface ParsedImages {
   images: number[][][]; // Le gros tableau 3D [N, H, W]
   stats: DatasetStats; // Stats globales
   image_info: ImageInfo[]; // Liste d'infos [N], indexée comme le tableau 'images'
-  warning: string | null; // Pour le "max 10 images" etc.
+  warning: string | null; // Pour la limite MAX_IMAGES etc.
 }
 
 export interface OpticalConfig {
@@ -219,7 +230,8 @@ const DEFAULT_OPTICAL_CONFIG: OpticalConfig = {
 
 /**
  * Generate default optical configuration based on number of images
- * Returns a config with predefined defocus values for 2-10 images
+ * Returns a config with predefined defocus values for 2-10 images, and
+ * evenly spaced values beyond
  */
 export const generateDefaultConfig = (numImages: number): OpticalConfig => {
   // Predefined defocus values for each image count
@@ -237,9 +249,14 @@ export const generateDefaultConfig = (numImages: number): OpticalConfig => {
     ],
   };
 
-  // Clamp to valid range and get preset
-  const clampedNum = Math.max(2, Math.min(10, numImages));
-  const defoc_z = defocusPresets[clampedNum];
+  // Beyond the presets (through-focus cubes), keep the 10 mm spacing
+  const clampedNum = Math.max(2, numImages);
+  const defoc_z =
+    defocusPresets[clampedNum] ??
+    Array.from(
+      { length: clampedNum },
+      (_, i) => Math.round((i - (clampedNum - 1) / 2) * 10) / 1000,
+    );
 
   return {
     ...DEFAULT_OPTICAL_CONFIG,
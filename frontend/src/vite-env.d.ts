@@ -2,6 +2,7 @@
 
 interface ImportMetaEnv {
   readonly VITE_API_URL?: string
+  readonly VITE_MAX_IMAGES?: string
   readonly DEV: boolean
   readonly PROD: boolean
   readonly MODE: string